@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+def make_extract(rows, columns, seed=0):
+    # A wide extract with the mix of keys, amounts, codes, dates and nulls the validation packs compare
+    import numpy as np
+    import pandas as pd
+    generator = np.random.default_rng(seed)
+    data = {"Acct_Id": np.arange(rows)}
+    for position in range(1, columns):
+        kind = position % 4
+        if kind == 0:
+            data[f"Amt_{position}"] = generator.normal(1000, 250, rows).round(2)
+        elif kind == 1:
+            data[f"Cd_{position}"] = generator.choice(["A", "B", "C", "DD", "EEE"], rows)
+        elif kind == 2:
+            data[f"Dt_{position}"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(generator.integers(0, 365, rows), unit="D")
+            data[f"Dt_{position}"] = data[f"Dt_{position}"].strftime("%Y-%m-%d")
+        else:
+            values = generator.integers(0, 10_000, rows).astype("float64")
+            values[generator.random(rows) < 0.1] = np.nan
+            data[f"Qty_{position}"] = values
+    return pd.DataFrame(data)
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings), 4)
+
+def run(rows, columns, repeat, directory):
+    import pandas as pd
+    from src.utilities import column_profiler, columnar, row_diff
+
+    frame = make_extract(rows, columns)
+    csv_path = os.path.join(directory, "extract.csv")
+    parquet_path = os.path.join(directory, "extract.parquet")
+    frame.to_csv(csv_path, index=False)
+    frame.to_parquet(parquet_path, index=False)
+    projected = list(frame.columns[:3])
+    records = list(frame.itertuples(index=False, name=None))
+
+    results = {
+        "rows": rows,
+        "columns": columns,
+        "csv_bytes": os.path.getsize(csv_path),
+        "parquet_bytes": os.path.getsize(parquet_path),
+        "csv": {
+            "read": timed(lambda: pd.read_csv(csv_path), repeat),
+            "read_3_columns": timed(lambda: pd.read_csv(csv_path, usecols=projected), repeat),
+            "shape": timed(lambda: pd.read_csv(csv_path).shape, repeat),
+            "profile": timed(lambda: column_profiler.profile_csv(csv_path), repeat),
+            "diff": timed(lambda: row_diff.diff_files(csv_path, csv_path, summary_only=True), repeat),
+        },
+        "parquet": {
+            "read": timed(lambda: columnar.read_frame(parquet_path), repeat),
+            "read_3_columns": timed(lambda: columnar.read_frame(parquet_path, projected), repeat),
+            "shape": timed(lambda: columnar.shape(parquet_path), repeat),
+            "profile": timed(lambda: column_profiler.profile_csv(parquet_path), repeat),
+            "diff": timed(lambda: row_diff.diff_files(parquet_path, parquet_path, summary_only=True), repeat),
+        },
+        # Result construction from driver row tuples, as done at the end of execute_query
+        "rows_to_dataframe": timed(lambda: pd.DataFrame(records, columns=list(frame.columns)), repeat),
+        "rows_to_arrow": timed(lambda: columnar.rows_to_batch(records, list(frame.columns)), repeat),
+    }
+    results["dataframe_mb"] = round(pd.DataFrame(records, columns=list(frame.columns)).memory_usage(deep=True).sum() / 2**20, 1)
+    results["arrow_mb"] = round(columnar.rows_to_batch(records, list(frame.columns)).nbytes / 2**20, 1)
+    results["speedup"] = {
+        operation: round(results["csv"][operation] / results["parquet"][operation], 1) if results["parquet"][operation] else None
+        for operation in results["csv"]
+    }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the CSV and Parquet/Arrow paths of the file helpers.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3, help="Measurements per operation, the median is reported")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(args.rows, args.columns, args.repeat, directory)
+    output = json.dumps(report, indent=4)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
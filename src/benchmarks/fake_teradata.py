@@ -0,0 +1,199 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+# Local stand-in for teradatasql and the teradata UdaExec ODBC path, backed by a SQLite file
+# attached as database "bench", so SELECTs against bench.<table> run unchanged on both sides.
+# Latency and failures are injected per logon, request and fetch call
+
+class Error(Exception):
+    pass
+
+class OperationalError(Error):
+    pass
+
+class Settings:
+    """Injected latency and failure rates, read from FAKE_TD_* variables unless given."""
+
+    def __init__(self, database=None, logon_seconds=None, execute_seconds=None, fetch_seconds=None,
+                 row_seconds=None, logon_failure_rate=None, failure_rate=None, drop_rate=None, seed=None):
+        self.database = database or os.getenv("FAKE_TD_DATABASE", os.path.join("target", "benchmarks", "fake_teradata.db"))
+        self.logon_seconds = setting(logon_seconds, "FAKE_TD_LOGON_SECONDS", 0.0)
+        self.execute_seconds = setting(execute_seconds, "FAKE_TD_EXECUTE_SECONDS", 0.0)
+        self.fetch_seconds = setting(fetch_seconds, "FAKE_TD_FETCH_SECONDS", 0.0)
+        self.row_seconds = setting(row_seconds, "FAKE_TD_ROW_SECONDS", 0.0)
+        self.logon_failure_rate = setting(logon_failure_rate, "FAKE_TD_LOGON_FAILURE_RATE", 0.0)
+        self.failure_rate = setting(failure_rate, "FAKE_TD_FAILURE_RATE", 0.0)
+        # A dropped session fails the request and every health check after it
+        self.drop_rate = setting(drop_rate, "FAKE_TD_DROP_RATE", 0.0)
+        self.random = random.Random(seed if seed is not None else int(os.getenv("FAKE_TD_SEED", "0")))
+        self._lock = threading.Lock()
+
+    def roll(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self.random.random() < rate
+
+def setting(value, name, default):
+    return float(value) if value is not None else float(os.getenv(name, default))
+
+settings = Settings()
+
+class Cursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.sqlite.cursor()
+        self._pending = []
+        self.description = None
+
+    def execute(self, query, params=None):
+        self.connection.check(self.connection.settings.execute_seconds, self.connection.settings.failure_rate)
+        # Multi-statement requests return one result set per statement, read in turn with nextset()
+        statements = [statement.strip() for statement in query.split(";") if statement.strip()]
+        self._pending = statements[1:]
+        self._execute(statements[0], params)
+        return self
+
+    def _execute(self, statement, params=None):
+        self._cursor.execute(statement, params or ())
+        self.description = self._cursor.description
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=None):
+        return self._fetched(self._cursor.fetchmany(size or self._cursor.arraysize))
+
+    def fetchall(self):
+        return self._fetched(self._cursor.fetchall())
+
+    def _fetched(self, rows):
+        fake = self.connection.settings
+        self.connection.check(fake.fetch_seconds + fake.row_seconds * len(rows))
+        return rows
+
+    def nextset(self):
+        if not self._pending:
+            return None
+        self._execute(self._pending.pop(0))
+        return True
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class Connection:
+
+    def __init__(self, fake=None):
+        self.settings = fake or settings
+        self.dropped = False
+        self.check(self.settings.logon_seconds, self.settings.logon_failure_rate, "Logon failed", can_drop=False)
+        # The helper runs requests on its own thread, so the SQLite connection must not be thread bound
+        self.sqlite = sqlite3.connect(":memory:", check_same_thread=False)
+        self.sqlite.execute("ATTACH DATABASE ? AS bench", (self.settings.database,))
+
+    def check(self, seconds=0.0, failure_rate=0.0, message="Request failed", can_drop=True):
+        if self.dropped:
+            raise OperationalError("Session is no longer connected")
+        if seconds:
+            time.sleep(seconds)
+        if can_drop and self.settings.roll(self.settings.drop_rate):
+            self.dropped = True
+            raise OperationalError("Session dropped")
+        if self.settings.roll(failure_rate):
+            raise OperationalError(message)
+
+    def cursor(self):
+        return Cursor(self)
+
+    def cancel(self):
+        self.sqlite.interrupt()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.sqlite.close()
+
+def connect(con_str=None, **kwargs):
+    # Same call shape as teradatasql.connect, the JSON connection string is accepted and ignored
+    if con_str:
+        json.loads(con_str)
+    return Connection()
+
+class UdaExec:
+
+    def __init__(self, appName=None, version=None, logConsole=True, **kwargs):
+        self.appName = appName
+
+    def connect(self, method=None, **kwargs):
+        return Connection()
+
+@contextmanager
+def installed(fake=None):
+    # Serves the lazy `import teradatasql` / `import teradata` in teradatahelper from this module
+    global settings
+    from src.utilities import connection_pool, teradatahelper
+    previous = {name: sys.modules.get(name) for name in ("teradatasql", "teradata")}
+    previous_settings = settings
+    settings = fake or settings
+    sys.modules["teradatasql"] = types.SimpleNamespace(connect=connect, Error=Error, OperationalError=OperationalError)
+    sys.modules["teradata"] = types.SimpleNamespace(UdaExec=UdaExec)
+    teradatahelper._uda_exec = None
+    try:
+        yield settings
+    finally:
+        connection_pool.close_all_pools()
+        teradatahelper._uda_exec = None
+        settings = previous_settings
+        for name, module in previous.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+def create_table(path, table, rows, columns=8, seed=0):
+    # A table with the mix of keys, amounts, codes and nullable dates the validation queries read
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    generator = random.Random(seed)
+    names = ["Acct_Id"] + [f"Col_{position}" for position in range(1, columns)]
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+        connection.execute(f"CREATE TABLE {table} ({', '.join(names)})")
+
+        def row(key):
+            values = [key]
+            for position in range(1, columns):
+                kind = position % 4
+                if kind == 0:
+                    values.append(round(generator.gauss(1000, 250), 2))
+                elif kind == 1:
+                    values.append(generator.choice(("A", "B", "C", "DD", "EEE")))
+                elif kind == 2:
+                    values.append(None if generator.random() < 0.1 else f"2024-{generator.randint(1, 12):02d}-{generator.randint(1, 28):02d}")
+                else:
+                    values.append(generator.randint(0, 10_000))
+            return values
+
+        connection.executemany(
+            f"INSERT INTO {table} VALUES ({', '.join('?' * columns)})", (row(key) for key in range(rows))
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    return names
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules imported by every xdist worker before the first scenario runs
+MODULES = [
+    "src.utilities.customlogger",
+    "src.utilities.helpers",
+    "src.utilities.credentials_cryptographer",
+    "src.utilities.teradatahelper",
+    "src.utilities.query_engine",
+    "src.utilities.sql_templates",
+    "src.utilities.table_catalog",
+    "tests.package_example.conftest",
+]
+
+# Dependencies that must only be loaded on first use, never by importing the modules above
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "teradatasql", "teradata", "cryptography", "allure"]
+
+PROBE = "import json, sys, {module}; print(json.dumps([name for name in {heavy} if name in sys.modules]))"
+
+def measure_import(module, python=sys.executable):
+    # Fresh interpreter per measurement, so nothing is already cached in sys.modules
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    wall_seconds = time.perf_counter() - started
+    cumulative_us = 0
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    return {"import_ms": cumulative_us / 1000, "wall_ms": wall_seconds * 1000, "heavy": json.loads(completed.stdout.strip().splitlines()[-1])}
+
+def measure_collection(path, python=sys.executable):
+    started = time.perf_counter()
+    subprocess.run(
+        [python, "-m", "pytest", path, "--collect-only", "-q", "-p", "no:cacheprovider"],
+        capture_output=True, text=True,
+    )
+    return (time.perf_counter() - started) * 1000
+
+def run(modules, repeat, collect_path=None):
+    results = {}
+    for module in modules:
+        runs = [measure_import(module) for _ in range(repeat)]
+        results[module] = {
+            "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+            "wall_ms": round(statistics.median(run["wall_ms"] for run in runs), 1),
+            "heavy": runs[0]["heavy"],
+        }
+    report = {"python": sys.version.split()[0], "repeat": repeat, "modules": results}
+    if collect_path:
+        report["collect_only_ms"] = round(statistics.median(measure_collection(collect_path) for _ in range(repeat)), 1)
+    return report
+
+def check(report, max_ms):
+    # Returns the regressions: heavy dependencies loaded at import, or imports over budget
+    problems = []
+    for module, result in report["modules"].items():
+        if result["heavy"]:
+            problems.append(f"{module} imports {', '.join(result['heavy'])} at import time")
+        if max_ms is not None and result["import_ms"] > max_ms:
+            problems.append(f"{module} takes {result['import_ms']}ms to import, budget is {max_ms}ms")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and collection time of the test pack modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="Modules to import (default: the modules every worker loads)")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per module, the median is reported")
+    parser.add_argument("--collect", default=None, help="Also time pytest --collect-only on this path")
+    parser.add_argument("--max-ms", type=float, default=None, help="Import time budget per module")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on a heavy import or an import over budget")
+    args = parser.parse_args()
+
+    report = run(args.modules, args.repeat, args.collect)
+    output = json.dumps(report, indent=4)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
+
+    problems = check(report, args.max_ms)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if args.check and problems:
+        sys.exit(1)
@@ -0,0 +1,263 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Throughput of logon, query, fetch and DataFrame conversion through TeradataHelper, the file
+# comparison helpers and Allure post-processing, without a warehouse. Queries run against
+# fake_teradata, so timings compare runs of this suite, not Teradata itself
+TABLE = "bench.accounts"
+
+def timed(func, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings), 4), result
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+def bench_logon(helper_class, sessions, repeat):
+    from src.utilities import connection_pool
+    connection_pool.close_all_pools()
+    helpers = [helper_class("bench", "bench", "bench", pool_size=sessions) for _ in range(sessions)]
+    started = time.perf_counter()
+    for helper in helpers:
+        helper.connect()
+    cold = time.perf_counter() - started
+    for helper in helpers:
+        helper.close_connection()
+
+    def warm():
+        for helper in helpers:
+            helper.connect()
+        for helper in helpers:
+            helper.close_connection()
+
+    warm_seconds, _ = timed(warm, repeat)
+    stats = connection_pool.pool_stats()
+    connection_pool.close_all_pools()
+    return {"sessions": sessions, "cold_seconds": round(cold, 4), "warm_seconds": warm_seconds, "pool": stats}
+
+def bench_queries(helper_class, rows, chunk_size, repeat):
+    helper = helper_class("bench", "bench", "bench")
+    helper.connect()
+    # The logon and first pandas import are measured elsewhere, not charged to the first case
+    helper.execute_query("SELECT 1")
+    query = f"SELECT * FROM {TABLE}"
+    batch = [f"SELECT * FROM {TABLE} WHERE Acct_Id % 4 = {remainder}" for remainder in range(4)]
+    cases = {
+        "fetchall": lambda: helper.execute_query(query, label="fetchall"),
+        "streamed": lambda: helper.execute_query(query, chunk_size=chunk_size, label="streamed"),
+        "arrow": lambda: helper.execute_query(query, as_arrow=True, label="arrow"),
+        "max_rows": lambda: helper.execute_query(query, chunk_size=chunk_size, max_rows=chunk_size, label="max_rows"),
+        "batch": lambda: helper.execute_batch(batch, label="batch"),
+    }
+    results = {}
+    try:
+        for name, func in cases.items():
+            seconds, result = timed(func, repeat)
+            fetched = sum(len(frame) for frame in result) if isinstance(result, list) else len(result)
+            results[name] = {
+                "seconds": seconds,
+                "rows": fetched,
+                "rows_per_second": rate(fetched, seconds),
+                # Phases of the last repetition, as recorded by the helper's query timer
+                "phases": {phase: round(value, 4) for phase, value in helper.metrics.phases.items()},
+            }
+    finally:
+        helper.close_connection()
+    results["table_rows"] = rows
+    return results
+
+def bench_failures(helper_class, fake, queries):
+    # Requests fail or drop their session at the injected rates, dropped sessions are replaced by the pool
+    from src.utilities import connection_pool
+    connection_pool.close_all_pools()
+    helper = helper_class("bench", "bench", "bench")
+    outcomes = {"ok": 0, "errors": 0}
+    started = time.perf_counter()
+    for position in range(queries):
+        try:
+            helper.connect()
+            result = helper.execute_query(f"SELECT * FROM {TABLE} WHERE Acct_Id < {100 + position}", label="failures")
+            outcomes["ok" if result is not None and not isinstance(result, Exception) else "errors"] += 1
+        except Exception:
+            # A failed logon leaves the helper without a session, the next query checks out a new one
+            outcomes["errors"] += 1
+    elapsed = time.perf_counter() - started
+    helper.close_connection()
+    outcomes.update(
+        seconds=round(elapsed, 4),
+        failure_rate=fake.failure_rate,
+        drop_rate=fake.drop_rate,
+        pool=connection_pool.pool_stats(),
+    )
+    connection_pool.close_all_pools()
+    return outcomes
+
+def bench_files(rows, columns, repeat, directory):
+    from src.benchmarks import columnar_path
+    from src.utilities import helpers
+    source = columnar_path.make_extract(rows, columns)
+    # The target differs in one row per thousand, so the diff has rows to report
+    target = source.copy()
+    changed = target.index[::1000]
+    target.loc[changed, target.columns[1]] = "ZZ"
+    source_path = os.path.join(directory, "source.csv")
+    target_path = os.path.join(directory, "target.csv")
+    source.to_csv(source_path, index=False)
+    target.to_csv(target_path, index=False)
+    key = [source.columns[0]]
+    cases = {
+        "row_count": lambda: helpers.compare_row_count_of_files(source_path, target_path),
+        "profile": lambda: helpers.generate_column_wise_counts(source_path),
+        "profile_chunked": lambda: helpers.generate_column_wise_counts(source_path, chunksize=200_000),
+        "profile_approximate": lambda: helpers.generate_column_wise_counts(source_path, chunksize=200_000, approximate_distinct=True),
+        "diff_summary": lambda: helpers.diff_files(source_path, target_path, summary_only=True),
+        "diff_by_key": lambda: helpers.diff_files(source_path, target_path, key_columns=key),
+    }
+    results = {"rows": rows, "columns": columns, "csv_bytes": os.path.getsize(source_path)}
+    for name, func in cases.items():
+        seconds, _ = timed(func, repeat)
+        results[name] = {"seconds": seconds, "rows_per_second": rate(rows, seconds)}
+    return results
+
+def write_allure_results(directory, count, seed=0):
+    # Result files shaped like allure-pytest-bdd output, with a share of failures to reclassify
+    generator = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for position in range(count):
+        roll = generator.random()
+        status = "passed" if roll < 0.8 else "failed" if roll < 0.95 else "skipped"
+        message = "" if status == "passed" else "AssertionError: counts differ" if roll < 0.9 else "OperationalError: session dropped"
+        result_uuid = str(uuid.UUID(int=generator.getrandbits(128)))
+        data = {
+            "uuid": result_uuid,
+            "name": f"Scenario {position}",
+            "status": status,
+            "statusDetails": {"message": message},
+            "steps": [{"name": f"step {step}", "status": "passed"} for step in range(6)],
+            "labels": [{"name": "feature", "value": "Example"}],
+            "start": 0,
+            "stop": 1,
+        }
+        with open(os.path.join(directory, f"{result_uuid}-result.json"), "w") as file:
+            json.dump(data, file)
+
+def bench_allure(results, workers, directory):
+    from src.utilities import modify_allure_results
+    results_dir = os.path.join(directory, "allure-results")
+    write_allure_results(results_dir, results)
+    timings = {"results": results}
+    # The second pass finds every file in the manifest and only lists the directory
+    for name in ("first_pass", "incremental_pass"):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            seconds, _ = timed(lambda: modify_allure_results.process_and_summarize_results(results_dir, workers), 1)
+        timings[name] = {"seconds": seconds, "files_per_second": rate(results, seconds), "summary": json.loads(output.getvalue().splitlines()[-1])}
+    return timings
+
+def run(args):
+    from src.benchmarks import fake_teradata
+    from src.utilities import teradatahelper
+    # Queries must reach the fake driver every time and the suite must not add to the run's metrics
+    os.environ["SQL_RESULT_CACHE"] = "0"
+    os.environ["QUERY_METRICS"] = "0"
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "arguments": vars(args),
+    }
+    sections = set(args.sections)
+    with tempfile.TemporaryDirectory() as directory:
+        if sections & {"logon", "query", "failures"}:
+            database = os.path.join(directory, "fake_teradata.db")
+            fake_teradata.create_table(database, TABLE.split(".")[1], args.rows)
+            fake = fake_teradata.Settings(
+                database=database, logon_seconds=args.logon_latency, execute_seconds=args.query_latency,
+                fetch_seconds=args.fetch_latency,
+            )
+            with fake_teradata.installed(fake):
+                if "logon" in sections:
+                    report["logon"] = bench_logon(teradatahelper.TeradataHelper, args.sessions, args.repeat)
+                if "query" in sections:
+                    report["query"] = bench_queries(teradatahelper.TeradataHelper, args.rows, args.chunk_size, args.repeat)
+            if "failures" in sections:
+                failing = fake_teradata.Settings(
+                    database=database, logon_seconds=args.logon_latency, execute_seconds=args.query_latency,
+                    fetch_seconds=args.fetch_latency, failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                )
+                with fake_teradata.installed(failing):
+                    report["failures"] = bench_failures(teradatahelper.TeradataHelper, failing, args.failure_queries)
+        if "files" in sections:
+            report["files"] = bench_files(args.file_rows, args.columns, args.repeat, directory)
+        if "allure" in sections:
+            report["allure"] = bench_allure(args.allure_results, args.workers, directory)
+    return report
+
+def timings(report, prefix=""):
+    # Flattens every "seconds" measurement to a dotted name, for comparing two reports
+    found = {}
+    for name, value in report.items():
+        if isinstance(value, dict):
+            found.update(timings(value, f"{prefix}{name}."))
+        elif name.endswith("seconds") and isinstance(value, (int, float)):
+            found[f"{prefix}{name}"] = value
+    return found
+
+def compare(report, baseline, tolerance):
+    # Measurements that got slower than the baseline by more than the tolerance
+    current, previous = timings(report), timings(baseline)
+    regressions = {}
+    for name, seconds in current.items():
+        before = previous.get(name)
+        if before and seconds > before * (1 + tolerance) and seconds - before > 0.01:
+            regressions[name] = {"baseline": before, "current": seconds, "ratio": round(seconds / before, 2)}
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the helpers against a local stand-in for Teradata.")
+    parser.add_argument("--sections", nargs="+", default=["logon", "query", "failures", "files", "allure"],
+                        choices=["logon", "query", "failures", "files", "allure"])
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows in the fake table")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--sessions", type=int, default=4, help="Sessions logged on by the logon benchmark")
+    parser.add_argument("--logon-latency", type=float, default=0.05, help="Seconds added to every logon")
+    parser.add_argument("--query-latency", type=float, default=0.01, help="Seconds added to every request")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="Seconds added to every fetch call")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Share of requests failing in the failures section")
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="Share of requests dropping their session")
+    parser.add_argument("--failure-queries", type=int, default=200)
+    parser.add_argument("--file-rows", type=int, default=1_000_000, help="Rows of the generated CSV extracts")
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--allure-results", type=int, default=5_000, help="Synthetic Allure result files")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used by the Allure post-processing")
+    parser.add_argument("--repeat", type=int, default=3, help="Measurements per operation, the median is reported")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report, exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            report["regressions"] = compare(report, json.load(file), args.tolerance)
+    output = json.dumps(report, indent=4, default=str)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
+    if report.get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,190 @@
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+# Errors meaning the warehouse is shedding load: TASM delays and rejections, session limits and
+# timeouts. Extend with ADMISSION_OVERLOAD_PATTERNS (a regular expression) for site specific messages
+OVERLOAD_PATTERN = re.compile(
+    r"delayed|too many sessions|session limit|virtual circuits|throttle|rejected|timed? ?out|"
+    r"\b(3130|8024)\b",
+    re.IGNORECASE,
+)
+# Best latency is kept for this many queries, the least recently seen are dropped first
+MAX_TRACKED_QUERIES = 500
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def enabled():
+    return os.getenv("ADMISSION_CONTROL", "").lower() in ("1", "true", "yes")
+
+def state_path(env=None):
+    # One state file per environment, as each has its own workload limits
+    return os.path.join(shared_cache.cache_dir("admission"), f"{env or os.getenv('DB_ENV', 'default')}.json")
+
+def is_overload(error):
+    if error is None:
+        return False
+    message = f"{type(error).__name__}: {error}"
+    extra = os.getenv("ADMISSION_OVERLOAD_PATTERNS")
+    return bool(OVERLOAD_PATTERN.search(message) or (extra and re.search(extra, message, re.IGNORECASE)))
+
+def jittered_delay(attempt, base, cap):
+    # Full jitter: a random wait up to the exponential backoff, so rejected workers do not retry in step
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class Governor:
+    """Cross-worker limit on concurrent queries, adjusted AIMD style from latency and overload errors."""
+
+    # The limit and the queries in flight are kept in one JSON file per DB_ENV under the shared cache,
+    # read and updated under a file lock by every worker (and every query thread) before and after a
+    # query. Each completed query raises the limit by about one per limit's worth of queries, an overload
+    # error or a query taking latency_factor times its best time cuts it by backoff, at most once per
+    # cooldown. The limit is kept between runs, so each environment settles on its own level
+    def __init__(self, path=None, initial=None, min_limit=None, max_limit=None, backoff=None,
+                 latency_factor=None, latency_floor=None, cooldown=None, token_ttl=None):
+        self.path = path or state_path()
+        self.initial = initial or float(os.getenv("ADMISSION_INITIAL_LIMIT", "4"))
+        self.min_limit = min_limit or float(os.getenv("ADMISSION_MIN_LIMIT", "1"))
+        self.max_limit = max_limit or float(os.getenv("ADMISSION_MAX_LIMIT", "16"))
+        self.backoff = backoff or float(os.getenv("ADMISSION_BACKOFF", "0.5"))
+        self.latency_factor = latency_factor or float(os.getenv("ADMISSION_LATENCY_FACTOR", "3"))
+        # Queries faster than this never count as congested, their timings are mostly noise
+        self.latency_floor = latency_floor if latency_floor is not None else float(os.getenv("ADMISSION_LATENCY_FLOOR", "2"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("ADMISSION_COOLDOWN", "10"))
+        # Tokens of a crashed worker are reclaimed once they are older than the longest query allowed
+        self.token_ttl = token_ttl or float(os.getenv("ADMISSION_TOKEN_TTL", "3600"))
+        self.wait_timeout = float(os.getenv("ADMISSION_WAIT_TIMEOUT", "1800"))
+        # No running query holds a token for longer than the query timeout, older ones are left over
+        self.stale_after = float(os.getenv("ADMISSION_STALE_SECONDS", os.getenv("SQL_QUERY_TIMEOUT", "1800")))
+
+    def _lock(self):
+        return shared_cache.FileLock(f"{self.path}.lock", timeout=60, stale_after=30, poll_interval=0.005)
+
+    def _read(self):
+        state = shared_cache.read_json(self.path, default=None) or {}
+        state.setdefault("limit", self.initial)
+        state.setdefault("in_flight", {})
+        state.setdefault("best", {})
+        state.setdefault("last_decrease", 0.0)
+        now = time.time()
+        state["in_flight"] = {
+            token: started for token, started in state["in_flight"].items() if now - started < self.token_ttl
+        }
+        return state
+
+    def _write(self, state):
+        shared_cache.atomic_write_json(self.path, state)
+
+    def try_acquire(self):
+        with self._lock():
+            state = self._read()
+            if len(state["in_flight"]) >= max(self.min_limit, int(state["limit"])):
+                return None
+            token = uuid.uuid4().hex
+            state["in_flight"][token] = time.time()
+            self._write(state)
+            return token
+
+    def acquire(self):
+        # Waits for a free slot, polling with jitter. After wait_timeout the query runs regardless,
+        # the governor only ever delays a scenario and never fails it
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            token = self.try_acquire()
+            if token is not None:
+                break
+            if time.monotonic() - started > self.wait_timeout:
+                logger.info(f"No admission slot after {self.wait_timeout}s, running the query anyway")
+                break
+            time.sleep(0.05 + jittered_delay(min(attempt, 5), 0.05, 1.0))
+            attempt += 1
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info(f"Query waited {waited:.1f}s for an admission slot")
+        return token
+
+    def release(self, token, seconds=None, query_key=None, error=None):
+        with self._lock():
+            state = self._read()
+            # The limit only grows while it is actually reached, not while workers are idle
+            saturated = len(state["in_flight"]) >= int(state["limit"])
+            state["in_flight"].pop(token, None)
+            if is_overload(error):
+                self._decrease(state, f"overload error: {error}")
+            elif error is None and seconds is not None:
+                best = state["best"].pop(query_key, None) if query_key else None
+                if best and seconds > self.latency_floor and seconds > best * self.latency_factor:
+                    self._decrease(state, f"latency {seconds:.1f}s against a best of {best:.1f}s")
+                elif saturated:
+                    # Additive increase of one slot per limit's worth of completed queries
+                    state["limit"] = min(self.max_limit, state["limit"] + 1 / max(state["limit"], 1))
+                if query_key:
+                    state["best"][query_key] = seconds if best is None else min(best, seconds)
+                    if len(state["best"]) > MAX_TRACKED_QUERIES:
+                        state["best"].pop(next(iter(state["best"])))
+            self._write(state)
+
+    def overloaded(self, reason):
+        # Signal from outside a query, e.g. a rejected logon
+        with self._lock():
+            state = self._read()
+            self._decrease(state, reason)
+            self._write(state)
+
+    def _decrease(self, state, reason):
+        now = time.time()
+        if now - state["last_decrease"] < self.cooldown:
+            return
+        previous = state["limit"]
+        state["limit"] = max(self.min_limit, previous * self.backoff)
+        state["last_decrease"] = now
+        logger.info(f"Admission limit lowered from {previous:.1f} to {state['limit']:.1f} ({reason})")
+
+    @contextmanager
+    def admit(self, query_key=None):
+        # Holds a slot for the duration of the block. The block reports its outcome through the
+        # yielded dict, as the helpers return most query errors instead of raising them
+        waiting = time.perf_counter()
+        token = self.acquire()
+        started = time.perf_counter()
+        outcome = {"error": None, "waited": started - waiting}
+        try:
+            yield outcome
+        except BaseException as ex:
+            outcome["error"] = ex
+            raise
+        finally:
+            if token is not None:
+                self.release(token, time.perf_counter() - started, query_key, outcome["error"])
+
+    def reset(self):
+        # Forgets the queries an interrupted earlier run left in flight, keeping the limit it settled on.
+        # Other runs against the same environment may share the state, so only stale tokens are dropped
+        with self._lock():
+            state = self._read()
+            now = time.time()
+            state["in_flight"] = {
+                token: started for token, started in state["in_flight"].items() if now - started < self.stale_after
+            }
+            self._write(state)
+        return state
+
+    def state(self):
+        with self._lock():
+            return self._read()
+
+def get_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = Governor()
+        return _governor
@@ -0,0 +1,163 @@
+import os
+import numpy as np
+import pandas as pd
+from src.utilities import columnar
+
+PROFILE_COLUMNS = ["Column", "Count", "Null Count", "Distinct Count", "Min Value (length)", "Max Value (length)"]
+
+class HyperLogLog:
+    """Approximate distinct counter for columns too large for an exact nunique."""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        # Strings hash the same whichever dtype a chunk was inferred as
+        hashes = pd.util.hash_array(np.asarray(values, dtype=str).astype(object))
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - bit_length(remainder) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+def bit_length(values):
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        lengths[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+class ColumnProfile:
+    """Count, null, distinct and string length profile of every column, mergeable across chunks."""
+
+    def __init__(self, columns, approximate_distinct=False):
+        self.columns = list(columns)
+        self.approximate_distinct = approximate_distinct
+        self.counts = pd.Series(0, index=self.columns, dtype="int64")
+        self.null_counts = pd.Series(0, index=self.columns, dtype="int64")
+        self.min_lengths = pd.Series(np.nan, index=self.columns)
+        self.max_lengths = pd.Series(np.nan, index=self.columns)
+        self.distinct = {column: HyperLogLog() if approximate_distinct else set() for column in self.columns}
+
+    def update(self, df):
+        # Counts and nulls for all columns in one vectorized pass each
+        self.counts = self.counts.add(df.count(), fill_value=0).astype("int64")
+        self.null_counts = self.null_counts.add(df.isna().sum(), fill_value=0).astype("int64")
+
+        columns = string_columns(df)
+        if columns:
+            lengths = df[columns].apply(lambda column: column.str.len())
+            self.min_lengths = pd.concat([self.min_lengths, lengths.min()], axis=1).min(axis=1).reindex(self.columns)
+            self.max_lengths = pd.concat([self.max_lengths, lengths.max()], axis=1).max(axis=1).reindex(self.columns)
+
+        for column in self.columns:
+            values = pd.unique(df[column].dropna())
+            if self.approximate_distinct:
+                self.distinct[column].add(values)
+            else:
+                self.distinct[column].update(values)
+        return self
+
+    def merge(self, other):
+        self.counts = self.counts.add(other.counts, fill_value=0).astype("int64")
+        self.null_counts = self.null_counts.add(other.null_counts, fill_value=0).astype("int64")
+        self.min_lengths = pd.concat([self.min_lengths, other.min_lengths], axis=1).min(axis=1)
+        self.max_lengths = pd.concat([self.max_lengths, other.max_lengths], axis=1).max(axis=1)
+        for column in self.columns:
+            if self.approximate_distinct:
+                self.distinct[column].merge(other.distinct[column])
+            else:
+                self.distinct[column].update(other.distinct[column])
+        return self
+
+    def distinct_counts(self):
+        if self.approximate_distinct:
+            return [self.distinct[column].count() for column in self.columns]
+        return [len(self.distinct[column]) for column in self.columns]
+
+    def to_frame(self, distinct_counts=None):
+        distinct_counts = distinct_counts if distinct_counts is not None else self.distinct_counts()
+        return pd.DataFrame({
+            "Column": self.columns,
+            "Count": self.counts.reindex(self.columns).to_numpy(),
+            "Null Count": self.null_counts.reindex(self.columns).to_numpy(),
+            "Distinct Count": distinct_counts,
+            "Min Value (length)": [format_length(value) for value in self.min_lengths.reindex(self.columns)],
+            "Max Value (length)": [format_length(value) for value in self.max_lengths.reindex(self.columns)],
+        }, columns=PROFILE_COLUMNS)
+
+def string_columns(df):
+    # Object columns holding text. Parquet/Arrow DECIMAL and DATE columns are object columns too,
+    # of Decimal and date values, and report "Null" lengths like other non-string columns
+    return [column for column in df.select_dtypes(include="object").columns
+            if pd.api.types.infer_dtype(df[column], skipna=True) == "string"]
+
+def format_length(value):
+    # Columns without string values report "Null", as generate_column_wise_counts always has
+    return "Null" if pd.isna(value) else int(value)
+
+def profile_dataframe(df):
+    # A frame already in memory is profiled with pandas' whole-frame reductions
+    profile = ColumnProfile(df.columns)
+    profile.counts = df.count().astype("int64")
+    profile.null_counts = df.isna().sum().astype("int64")
+    columns = string_columns(df)
+    if columns:
+        lengths = df[columns].apply(lambda column: column.str.len())
+        profile.min_lengths = lengths.min().reindex(profile.columns)
+        profile.max_lengths = lengths.max().reindex(profile.columns)
+    return profile.to_frame(distinct_counts=df.nunique().reindex(profile.columns).tolist())
+
+def csv_dtypes(source, chunksize, columns=None):
+    # First pass over a CSV finding the dtype pandas gives each column when it reads the whole file:
+    # numeric or boolean only if every chunk was read as such. Chunks are then read with those dtypes
+    # instead of inferring their own, which would turn "007" into 7 in one chunk and keep it in another
+    numeric, boolean = {}, {}
+    for chunk in pd.read_csv(source, chunksize=chunksize, usecols=columns):
+        for column, dtype in chunk.dtypes.items():
+            numeric[column] = numeric.get(column, True) and pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+            boolean[column] = boolean.get(column, True) and pd.api.types.is_bool_dtype(dtype)
+    if not numeric:
+        return None
+    return {column: "float64" if numeric[column] else "bool" if boolean[column] else str for column in numeric}
+
+def read_profile_chunks(source, chunksize, columns=None):
+    if columnar.is_columnar(source):
+        for batch in columnar.iter_batches(source, chunksize, columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(source, chunksize=chunksize, usecols=columns, dtype=csv_dtypes(source, chunksize, columns))
+
+def profile_csv(csv_file, chunksize=None, approximate_distinct=False, columns=None):
+    # Without a chunk size the file is read whole, otherwise partial profiles of each chunk are merged.
+    # Parquet and Arrow files are accepted too, and columns limits the profile to those columns
+    chunksize = chunksize or (int(os.getenv("PROFILE_CHUNK_SIZE")) if os.getenv("PROFILE_CHUNK_SIZE") else None)
+    if chunksize is None and not approximate_distinct:
+        return profile_dataframe(columnar.read_frame(csv_file, columns))
+
+    profile = None
+    for chunk in read_profile_chunks(csv_file, chunksize or 1_000_000, columns):
+        if profile is None:
+            profile = ColumnProfile(chunk.columns, approximate_distinct=approximate_distinct)
+        profile.update(chunk)
+    if profile is None:
+        profile = ColumnProfile(columnar.read_table(csv_file, columns).schema.names if columnar.is_columnar(csv_file)
+                                else pd.read_csv(csv_file, nrows=0, usecols=columns).columns, approximate_distinct=approximate_distinct)
+    return profile.to_frame()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+def is_columnar(source):
+    # Parquet and Arrow files or in-memory Arrow tables, everything else is treated as CSV
+    if isinstance(source, (str, os.PathLike)):
+        return str(source).lower().endswith(PARQUET_SUFFIXES + ARROW_SUFFIXES)
+    return hasattr(source, "schema") and hasattr(source, "num_rows")
+
+def rows_to_batch(rows, columns):
+    # Builds the Arrow columns straight from the driver's row tuples, without a pandas object frame
+    import pyarrow as pa
+    if not rows:
+        return pa.RecordBatch.from_arrays([pa.array([], type=pa.null()) for _ in columns], names=list(columns))
+    return pa.RecordBatch.from_arrays([pa.array(values, from_pandas=True) for values in zip(*rows)], names=list(columns))
+
+def batches_to_table(batches):
+    # Chunks may type a column differently while it is all null, so their schemas are unified
+    import pyarrow as pa
+    return pa.concat_tables([pa.Table.from_batches([batch]) for batch in batches], promote_options="permissive")
+
+def read_table(source, columns=None):
+    # Parquet and Arrow IPC files are memory mapped and only the requested columns are read
+    import pyarrow as pa
+    if hasattr(source, "schema") and hasattr(source, "num_rows"):
+        return source if columns is None else source.select(list(columns))
+    path = str(source)
+    if path.lower().endswith(PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if path.lower().endswith(ARROW_SUFFIXES):
+        with pa.memory_map(path, "r") as source_file:
+            table = pa.ipc.open_file(source_file).read_all()
+        return table if columns is None else table.select(list(columns))
+    import pyarrow.csv as pa_csv
+    convert_options = pa_csv.ConvertOptions(include_columns=list(columns)) if columns is not None else None
+    return pa_csv.read_csv(path, convert_options=convert_options)
+
+def read_frame(source, columns=None):
+    # DataFrame from a CSV path, Parquet/Arrow file, Arrow table or DataFrame. CSV keeps going
+    # through pd.read_csv so the inferred types stay what the CSV based checks always used
+    import pandas as pd
+    if isinstance(source, pd.DataFrame):
+        return source if columns is None else source[list(columns)]
+    if is_columnar(source):
+        return read_table(source, columns).to_pandas()
+    return pd.read_csv(source, usecols=columns)
+
+def shape(source):
+    # (rows, columns) of a file, read from the Parquet footer or Arrow schema where possible
+    if isinstance(source, (str, os.PathLike)) and str(source).lower().endswith(PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(str(source), memory_map=True).metadata
+        return metadata.num_rows, metadata.num_columns
+    if is_columnar(source):
+        table = read_table(source)
+        return table.num_rows, table.num_columns
+    return read_frame(source).shape
+
+def iter_batches(source, batch_size, columns=None):
+    # Arrow record batches of a Parquet/Arrow file or table, read batch by batch from the mapped file
+    if isinstance(source, (str, os.PathLike)) and str(source).lower().endswith(PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(str(source), memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+        return
+    yield from read_table(source, columns).to_batches(max_chunksize=batch_size)
+
+def batch_as_text(batch):
+    # Every column as strings with nulls as "", the way the CSV side is read for comparisons
+    import pyarrow as pa
+    return pa.table([float_as_text(column) if pa.types.is_floating(column.type) else column.cast(pa.string()).fill_null("")
+                     for column in batch.columns], names=batch.schema.names).to_pandas()
+
+def float_as_text(column):
+    # Arrow writes whole floats as 4108 where pandas' CSV output has 4108.0, so the ".0" is added back
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    text = column.cast(pa.string())
+    whole = pc.and_(pc.equal(column, pc.floor(column)), pc.less(pc.abs(column), 1e16))
+    text = pc.if_else(whole, pc.binary_join_element_wise(text, pa.scalar(".0"), ""), text)
+    return pc.if_else(pc.is_nan(column), "", text).fill_null("")
+
+class ExtractCache:
+    """Query extracts written once to Parquet and reused for repeated comparisons."""
+
+    # Extracts are keyed by the query text and DB_ENV and streamed to disk in record batches, so an
+    # extract larger than memory can be cached. The first worker writes it, others wait on the lock
+    def __init__(self, directory=None, ttl=None):
+        self.directory = directory or shared_cache.cache_dir("extracts")
+        self.ttl = ttl if ttl is not None else float(os.getenv("EXTRACT_CACHE_TTL", "86400"))
+
+    def path(self, query, env=None):
+        digest = hashlib.sha256(f"{query}\0{env or os.getenv('DB_ENV')}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.parquet")
+
+    def get(self, db_helper, query, chunk_size=None, refresh=False):
+        path = self.path(query)
+        if not refresh and shared_cache.is_fresh(path, self.ttl):
+            return path
+        # Extracts can run for longer than any fixed staleness window, so the writer keeps its lock
+        # fresh and the other workers wait for as long as it is alive
+        with shared_cache.FileLock(f"{path}.lock", timeout=None, stale_after=120, heartbeat=30):
+            if not refresh and shared_cache.is_fresh(path, self.ttl):
+                return path
+            self.write(db_helper, query, path, chunk_size)
+        return path
+
+    def write(self, db_helper, query, path, chunk_size=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        started = time.perf_counter()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        helper = db_helper.clone()
+        helper.connect()
+        rows, writer, pending = 0, None, []
+
+        def write_batches(batches):
+            for batch in batches:
+                if not batch.num_rows:
+                    continue
+                if batch.schema != writer.schema:
+                    batch = pa.Table.from_batches([batch]).cast(writer.schema).combine_chunks().to_batches()[0]
+                writer.write_batch(batch)
+
+        try:
+            for batch in helper.stream_query(query, chunk_size=chunk_size, as_arrow=True):
+                rows += batch.num_rows
+                if writer is not None:
+                    write_batches([batch])
+                    continue
+                # Columns that are all null so far have no type yet, so chunks are held back until
+                # every column has been typed by some chunk (or the result ends)
+                pending.append(batch)
+                schema = pa.unify_schemas([pending_batch.schema for pending_batch in pending], promote_options="permissive")
+                if not any(pa.types.is_null(field.type) for field in schema):
+                    writer = pq.ParquetWriter(temp_path, schema)
+                    write_batches(pending)
+                    pending = []
+            if writer is None:
+                schema = pa.unify_schemas([pending_batch.schema for pending_batch in pending], promote_options="permissive")
+                writer = pq.ParquetWriter(temp_path, schema)
+                write_batches(pending)
+        finally:
+            helper.close_connection()
+            if writer is not None:
+                writer.close()
+        os.replace(temp_path, path)
+        logger.info(f"Extract of {rows} rows cached in {path} ({time.perf_counter() - started:.1f}s)")
+
+def extract_to_parquet(db_helper, query, chunk_size=None, refresh=False):
+    return ExtractCache().get(db_helper, query, chunk_size=chunk_size, refresh=refresh)
@@ -0,0 +1,197 @@
+import os
+import queue
+import threading
+import time
+from src.utilities import admission_control, customlogger
+
+logger = customlogger.custom_logger()
+
+# Pools are shared per process (i.e. per xdist worker) and keyed by host/user/driver
+_pools = {}
+_pools_lock = threading.Lock()
+
+class PoolExhaustedError(Exception):
+    pass
+
+class ConnectionPool:
+    """Bounded pool of warm database sessions for a single worker process."""
+
+    def __init__(self, connect_func, max_size=None, health_check_query="SELECT 1", checkout_timeout=None):
+        self.connect_func = connect_func
+        self.max_size = max_size or int(os.getenv("TD_POOL_SIZE", "4"))
+        self.health_check_query = health_check_query
+        self.checkout_timeout = checkout_timeout or float(os.getenv("TD_POOL_CHECKOUT_TIMEOUT", "600"))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._in_use = set()
+        self._closed = False
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "health_check_failures": 0,
+            "reconnects": 0,
+            "logon_retries": 0,
+            "discarded": 0,
+            "peak_in_use": 0,
+            "logon_seconds": [],
+        }
+
+    def acquire(self):
+        # Block until a slot is free so a worker never holds more than max_size sessions
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolExhaustedError(f"No connection available after {self.checkout_timeout}s (pool size {self.max_size})")
+        try:
+            conn = self._checkout_idle()
+            if conn is None:
+                conn = self._logon()
+                self._count("misses")
+            else:
+                self._count("hits")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use.add(id(conn))
+            self.metrics["peak_in_use"] = max(self.metrics["peak_in_use"], len(self._in_use))
+        return conn
+
+    def release(self, conn, discard=False):
+        if conn is None:
+            return
+        with self._lock:
+            if id(conn) not in self._in_use:
+                return
+            self._in_use.discard(id(conn))
+
+        if discard or self._closed:
+            self._close_quietly(conn)
+            if discard:
+                self._count("discarded")
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def replace(self, conn):
+        # Swap a dropped session for a fresh one without giving up the caller's slot
+        with self._lock:
+            self._in_use.discard(id(conn))
+        self._close_quietly(conn)
+        try:
+            new_conn = self._logon()
+        except Exception:
+            self._slots.release()
+            raise
+        self._count("reconnects")
+        with self._lock:
+            self._in_use.add(id(new_conn))
+        return new_conn
+
+    def is_healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(self.health_check_query)
+                cur.fetchall()
+            finally:
+                cur.close()
+            return True
+        except Exception as e:
+            logger.info(f"Pooled session failed health check: {e}")
+            return False
+
+    def close_all(self):
+        self._closed = True
+        closed = 0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+            closed += 1
+        logger.info(f"Connection pool closed {closed} idle sessions. Stats: {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            logons = list(self.metrics["logon_seconds"])
+            stats = {key: value for key, value in self.metrics.items() if key != "logon_seconds"}
+            stats["in_use"] = len(self._in_use)
+        stats["idle"] = self._idle.qsize()
+        stats["max_size"] = self.max_size
+        checkouts = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / checkouts, 3) if checkouts else 0.0
+        stats["logons"] = len(logons)
+        stats["logon_seconds_total"] = round(sum(logons), 3)
+        stats["logon_seconds_avg"] = round(sum(logons) / len(logons), 3) if logons else 0.0
+        stats["logon_seconds_max"] = round(max(logons), 3) if logons else 0.0
+        return stats
+
+    def _checkout_idle(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if self.is_healthy(conn):
+                return conn
+            self._count("health_check_failures")
+            self._close_quietly(conn)
+
+    def _logon(self):
+        # Logons rejected by workload management are retried with jittered backoff, other errors are raised
+        retries = int(os.getenv("LOGON_RETRIES", "5"))
+        base = float(os.getenv("LOGON_RETRY_SECONDS", "2"))
+        cap = float(os.getenv("LOGON_RETRY_MAX_SECONDS", "60"))
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                conn = self.connect_func()
+                break
+            except Exception as e:
+                if attempt >= retries or not admission_control.is_overload(e):
+                    raise
+                delay = admission_control.jittered_delay(attempt, base, cap)
+                logger.info(f"Logon rejected ({e}), retry {attempt + 1} of {retries} in {delay:.1f}s")
+                self._count("logon_retries")
+                if admission_control.enabled():
+                    admission_control.get_governor().overloaded(f"logon rejected: {e}")
+                time.sleep(delay)
+                attempt += 1
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.metrics["logon_seconds"].append(elapsed)
+        logger.info(f"New pooled session logged on in {elapsed:.3f}s")
+        return conn
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.info(f"Error closing pooled session: {e}")
+
+def get_pool(key, connect_func, max_size=None):
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect_func, max_size=max_size)
+            _pools[key] = pool
+        return pool
+
+def pool_stats():
+    with _pools_lock:
+        return {f"{key[0]}/{key[1]}": pool.stats() for key, pool in _pools.items()}
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -1,10 +1,16 @@
-from cryptography.fernet import Fernet
-
 # The key generation and Encryption can be done periodically to ensure there are new values for security reasons
 
 # key = Fernet.generate_key()
 key = b'XTiTsoOJq5qTqmkXG_fKAeelckl3qlEiTPFBarJ5ryU='
-crypter = Fernet(key)
+crypter = None
+
+def get_crypter():
+    # cryptography is only imported when a credential is first decrypted
+    global crypter
+    if crypter is None:
+        from cryptography.fernet import Fernet
+        crypter = Fernet(key)
+    return crypter
 
 #user_name = crypter.encrypt(b"")
 #print(str(user_name,'utf8'))
@@ -14,7 +20,7 @@ crypter = Fernet(key)
 
 def decrypt_credential(cred):
     try:
-        decrypted_cred = crypter.decrypt(cred)
+        decrypted_cred = get_crypter().decrypt(cred)
         return str(decrypted_cred,'utf8')
     except:
         return None
@@ -1,38 +1,107 @@
-import inspect
+import atexit
+import glob
+import heapq
 import logging
-from src.configs import configurations
-from pathlib import Path
+import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
+from src.configs import configurations
 
-def custom_logger():
-    # For getting the class/ method name from where the logger is called
-    log_name = inspect.stack()[1][3]
+LOG_FORMAT = '%(asctime)s - %(levelname)s : %(message)s'
+DATE_FORMAT = '%d%m%y %I:%M:%S %p %A'
 
-    # Logger object with log name as parameter
-    logger = logging.getLogger(log_name)
+# One queue and one background listener per process, every logger writes through them
+_queue = queue.SimpleQueue()
+_listener = None
+_file_handler = None
+_lock = threading.Lock()
+
+def log_file_path():
+    # Each xdist worker writes its own file, the controller or a plain run writes test_logs.log
+    worker = os.getenv("PYTEST_XDIST_WORKER")
+    file_name = f"test_logs_{worker}.log" if worker else "test_logs.log"
+    os.makedirs(configurations.get_absolute_path("logs", ""), exist_ok=True)
+    return configurations.get_absolute_path("logs", file_name)
 
-    # Set the log level
-    logger.setLevel(logging.DEBUG)
+def start_listener():
+    global _listener, _file_handler
+    with _lock:
+        if _listener is None:
+            _file_handler = logging.FileHandler(log_file_path(), mode='a', delay=True)
+            _file_handler.setLevel(logging.DEBUG)
+            _file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT))
+            _listener = logging.handlers.QueueListener(_queue, _file_handler, respect_handler_level=True)
+            _listener.start()
 
-    # Create file handler to save the logs in a file
-    if os.path.exists("logs"):
-        log_file = configurations.get_relative_path("logs", "test_logs.log")
-        file_handler = logging.FileHandler(log_file, mode='a')
-    else:
-        os.mkdir("logs")
-        log_file = Path("logs", "test_logs.log")
-        file_handler = logging.FileHandler(log_file, mode='a')
+def stop_listener():
+    # Writes out everything still queued and closes the log file
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            _file_handler.close()
 
-    # Set the log level for the file handler
-    file_handler.setLevel(logging.DEBUG)
+atexit.register(stop_listener)
 
-    # Define the format for the logs
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s : %(message)s', datefmt='%d%m%y %I:%M:%S %p %A')
+def flush():
+    # Drains the queue to disk, the next record starts a fresh listener
+    stop_listener()
 
-    # Define formatter for fileHandler
-    file_handler.setFormatter(formatter)
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that starts the listener, and so creates the log file, on the first record."""
 
-    # Add file handler to logging
-    logger.addHandler(file_handler)
+    def enqueue(self, record):
+        if _listener is None:
+            start_listener()
+        super().enqueue(record)
+
+def custom_logger():
+    # For getting the class/ method name from where the logger is called, without building the whole stack
+    log_name = sys._getframe(1).f_code.co_name
+
+    # Logger object with log name as parameter
+    logger = logging.getLogger(log_name)
+
+    # Each logger gets a single queue handler, however often it is asked for
+    if not any(isinstance(handler, logging.handlers.QueueHandler) for handler in logger.handlers):
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(LazyQueueHandler(_queue))
 
     return logger
+
+def merge_worker_logs(remove=True):
+    # Folds the xdist workers' files into test_logs.log in timestamp order, run on the controller after the workers finished
+    main_log = configurations.get_absolute_path("logs", "test_logs.log")
+    worker_logs = sorted(glob.glob(configurations.get_absolute_path("logs", "test_logs_gw*.log")))
+    if not worker_logs:
+        return None
+
+    stop_listener()
+    sources = [path for path in [main_log] + worker_logs if os.path.exists(path)]
+    files = [open(path, "r") for path in sources]
+    temp_path = f"{main_log}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as merged:
+            merged.writelines(line for _, line in heapq.merge(*[timestamped_lines(file) for file in files], key=lambda entry: entry[0]))
+    finally:
+        for file in files:
+            file.close()
+    os.replace(temp_path, main_log)
+    if remove:
+        for path in worker_logs:
+            os.remove(path)
+    return main_log
+
+def timestamped_lines(file):
+    # Lines without a timestamp (tracebacks, multi-line messages) keep the time of the record they belong to
+    timestamp = 0.0
+    for line in file:
+        try:
+            timestamp = time.mktime(time.strptime(line.split(" - ", 1)[0], DATE_FORMAT))
+        except ValueError:
+            pass
+        yield timestamp, line
@@ -0,0 +1,177 @@
+import heapq
+import os
+import statistics
+import time
+import pytest
+from xdist.scheduler import LoadScheduling
+from src.utilities import customlogger, helpers, shared_cache
+
+logger = customlogger.custom_logger()
+
+# Number of recent runs kept per scenario and per SQL file
+HISTORY_LENGTH = 5
+
+class DurationHistory:
+    """Recent runtimes of each scenario and SQL file, kept in the shared cache between runs."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(shared_cache.cache_dir("durations"), "history.json")
+        data = shared_cache.read_json(self.path, default={}) or {}
+        self.tests = data.get("tests", {})
+        self.sql = data.get("sql", {})
+        self.default_seconds = float(os.getenv("DEFAULT_SCENARIO_SECONDS", "30"))
+        known = [statistics.median(durations) for durations in self.tests.values() if durations]
+        self.fallback_seconds = statistics.median(known) if known else self.default_seconds
+
+    def record(self, nodeid, seconds, sql_file=None, sql_seconds=None):
+        self.tests[nodeid] = (self.tests.get(nodeid, []) + [round(seconds, 3)])[-HISTORY_LENGTH:]
+        if sql_file and sql_seconds is not None:
+            self.sql[sql_file] = (self.sql.get(sql_file, []) + [round(sql_seconds, 3)])[-HISTORY_LENGTH:]
+
+    def predict(self, nodeid, sql_file=None):
+        # Scenario history first, then the SQL file's history, then the median of everything known
+        if self.tests.get(nodeid):
+            return statistics.median(self.tests[nodeid]), True
+        if sql_file and self.sql.get(sql_file):
+            return statistics.median(self.sql[sql_file]), True
+        return self.fallback_seconds, False
+
+    def save(self):
+        shared_cache.atomic_write_json(self.path, {"tests": self.tests, "sql": self.sql})
+
+def predicted_makespan(durations, workers):
+    # Longest-processing-time-first assignment, as LongestFirstScheduling hands the items out
+    loads = [0.0] * max(1, workers)
+    for duration in sorted(durations, reverse=True):
+        heapq.heappush(loads, heapq.heappop(loads) + duration)
+    return max(loads)
+
+def item_example(item):
+    callspec = getattr(item, "callspec", None)
+    if callspec is None or '_pytest_bdd_example' not in callspec.params:
+        return {}
+    return helpers.get_example_params(item)
+
+class LongestFirstScheduling(LoadScheduling):
+    """xdist load scheduling that hands the longest-first items out one at a time to whichever worker is free."""
+
+    # The default load scheduler sends each worker a block of consecutive items, which would give the
+    # first worker all of the longest scenarios. Here every worker holds at most two items, the one
+    # it is running and the next one, which the worker needs to know when to tear down fixtures
+    def schedule(self):
+        assert self.collection_is_completed
+        if self.collection is not None:
+            for node in self.nodes:
+                self.check_schedule(node)
+            return
+        if not self._check_nodes_have_same_collection():
+            self.log("**Different tests collected, aborting run**")
+            return
+        self.collection = next(iter(self.node2collection.values()))
+        self.pending[:] = range(len(self.collection))
+        # Round robin, so the longest items start first on different workers
+        for _ in range(2):
+            for node in self.nodes:
+                self._send_tests(node, 1)
+        if not self.pending:
+            for node in self.nodes:
+                node.shutdown()
+
+    def check_schedule(self, node, duration=0):
+        if node.shutting_down:
+            return
+        if self.pending:
+            node_pending = self.node2pending[node]
+            if len(node_pending) < 2:
+                self._send_tests(node, 2 - len(node_pending))
+        else:
+            node.shutdown()
+
+class DurationSchedulerPlugin:
+    """Orders scenarios longest-first from recorded runtimes and reports predicted against actual makespan."""
+
+    # Ordering happens in pytest_collection_modifyitems, which under xdist runs identically on every
+    # worker, and with the default load distribution LongestFirstScheduling hands the items out in
+    # that order. Recording happens on the controller from the reports forwarded by the workers
+    def __init__(self, config):
+        self.config = config
+        self.is_worker = hasattr(config, "workerinput")
+        # The first worker leaves its predictions here for the controller, which does not collect
+        self.predictions_path = (
+            config.workerinput.get("duration_predictions") if self.is_worker
+            else os.path.join(shared_cache.cache_dir("durations"), f"predictions_{os.getpid()}.json")
+        )
+        self.order_by_duration = config.getoption("--schedule-by-duration")
+        self.group_by_table = config.getoption("--group-by-table")
+        self.history = DurationHistory()
+        self.started_at = time.monotonic()
+        self.predicted = None
+        self.unknown = 0
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        predictions, unknown = {}, 0
+        for item in items:
+            example = item_example(item)
+            predictions[item.nodeid], known = self.history.predict(item.nodeid, example.get('sql_query'))
+            unknown += not known
+            if self.group_by_table and example.get('data_entity'):
+                # With --dist loadgroup, scenarios against the same table share a worker and its sessions
+                item.add_marker(pytest.mark.xdist_group(name=example['data_entity']))
+        if self.order_by_duration:
+            # Stable sort keeps the collection order for scenarios with the same prediction
+            items.sort(key=lambda item: predictions[item.nodeid], reverse=True)
+        if not self.is_worker:
+            self.predicted, self.unknown = predicted_makespan(predictions.values(), 1), unknown
+        elif self.predictions_path and config.workerinput.get("workerid") == "gw0":
+            shared_cache.atomic_write_json(self.predictions_path, {"predictions": predictions, "unknown": unknown})
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        node.workerinput["duration_predictions"] = self.predictions_path
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_xdist_make_scheduler(self, config, log):
+        if self.order_by_duration and config.getoption("dist") == "load":
+            return LongestFirstScheduling(config, log)
+        return None
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_xdist_node_collection_finished(self, node, ids):
+        # The controller does not collect, so it uses the predictions the first worker made with the
+        # Examples' SQL files, falling back to the scenario history alone if they are not there yet
+        if self.predicted is None:
+            data = shared_cache.read_json(self.predictions_path, default=None) or {}
+            predictions = data.get("predictions", {})
+            if set(predictions) == set(ids):
+                durations, self.unknown = list(predictions.values()), data.get("unknown", 0)
+            else:
+                estimates = [self.history.predict(nodeid) for nodeid in ids]
+                durations = [seconds for seconds, _ in estimates]
+                self.unknown = sum(1 for _, known in estimates if not known)
+            workers = len(self.config.getoption("tx") or []) or int(self.config.getoption("numprocesses") or 1)
+            self.predicted = predicted_makespan(durations, workers)
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker or report.when != "call":
+            return
+        properties = dict(report.user_properties)
+        self.history.record(report.nodeid, report.duration, properties.get("sql_query"), properties.get("query_seconds"))
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        if not self.is_worker:
+            self.history.save()
+            try:
+                os.remove(self.predictions_path)
+            except OSError:
+                pass
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.is_worker or self.predicted is None or self.config.option.collectonly:
+            return
+        actual = time.monotonic() - self.started_at
+        terminalreporter.write_line(
+            f"Duration scheduler: predicted makespan {self.predicted:.1f}s, actual {actual:.1f}s "
+            f"({self.unknown} scenarios without history)"
+        )
+        logger.info(f"Predicted makespan {self.predicted:.1f}s, actual {actual:.1f}s")
@@ -0,0 +1,64 @@
+import glob
+import hashlib
+import os
+import pickle
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+def enabled():
+    return os.getenv("FEATURE_CACHE", "1").lower() not in ("0", "false", "no")
+
+def parser_version():
+    from importlib import metadata
+    try:
+        return metadata.version("pytest-bdd")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def cache_path(feature_path, version):
+    # Keyed by the file's location and content and the pytest-bdd version, so any edit or upgrade reparses
+    digest = hashlib.sha1(f"{os.path.abspath(feature_path)}\0{version}\0".encode())
+    with open(feature_path, "rb") as file:
+        digest.update(file.read())
+    return os.path.join(shared_cache.cache_dir("features"), f"{digest.hexdigest()}.pickle")
+
+def load_feature(feature_path, version, encoding="utf-8"):
+    # The parsed Feature (scenarios, steps and Examples rows) is pickled once and unpickled by
+    # every later worker and run, which is much cheaper than parsing thousands of Examples rows
+    from pytest_bdd.parser import parse_feature
+    path = cache_path(feature_path, version)
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.info(f"Cached feature {path} unreadable, parsing again: {e}")
+    base_path, filename = os.path.split(os.path.abspath(feature_path))
+    feature = parse_feature(base_path, filename, encoding=encoding)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump(feature, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    return feature
+
+def preload(features_dir, encoding="utf-8"):
+    # Fills pytest-bdd's own feature dictionary before collection, so scenarios() finds every
+    # feature already parsed. Runs on the controller before the workers start, so they only unpickle
+    if not enabled():
+        return 0
+    from pytest_bdd import feature as bdd_feature
+    version = parser_version()
+    loaded = 0
+    for feature_path in glob.glob(os.path.join(features_dir, "**", "*.feature"), recursive=True):
+        full_name = os.path.abspath(feature_path)
+        if full_name in bdd_feature.features:
+            continue
+        try:
+            bdd_feature.features[full_name] = load_feature(full_name, version, encoding)
+            loaded += 1
+        except Exception as e:
+            # pytest-bdd parses the file itself during collection and reports the error there
+            logger.info(f"Feature {feature_path} not cached: {e}")
+    return loaded
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+import time
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+# One index per search root per process, the on-disk copy is shared between xdist workers
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+class FileIndex:
+    """File name index of a search root, built once and invalidated when a directory changes."""
+
+    # Adding, removing or renaming a file changes the mtime of its directory, so comparing the
+    # recorded directory mtimes is enough to know the index is stale. The check is throttled to
+    # once every recheck_interval seconds so lookups stay dictionary reads
+    def __init__(self, search_path, recheck_interval=None):
+        self.search_path = search_path
+        self.recheck_interval = recheck_interval if recheck_interval is not None else float(os.getenv("FILE_INDEX_RECHECK_SECONDS", "5"))
+        root_key = hashlib.sha1(os.path.abspath(search_path).encode()).hexdigest()[:16]
+        self.cache_file = os.path.join(shared_cache.cache_dir("file_index"), f"{root_key}.json")
+        self.files = {}
+        self.dir_mtimes = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def find(self, file_name):
+        self.refresh_if_stale()
+        paths = self.files.get(file_name)
+        if not paths:
+            # The file may have been written since the last check, a miss is only trusted on a current index
+            self.refresh_if_stale(force=True)
+            paths = self.files.get(file_name)
+        return paths[0] if paths else None
+
+    def duplicates(self):
+        return {name: paths for name, paths in self.files.items() if len(paths) > 1}
+
+    def load(self):
+        data = shared_cache.read_json(self.cache_file)
+        if data and data.get("search_path") == self.search_path:
+            self.files, self.dir_mtimes = data["files"], data["dir_mtimes"]
+            self._checked_at = time.monotonic()
+            if self.is_valid():
+                return
+        with shared_cache.FileLock(f"{self.cache_file}.lock"):
+            # Another worker may have rebuilt the index while we waited for the lock
+            data = shared_cache.read_json(self.cache_file)
+            if data and data.get("search_path") == self.search_path:
+                self.files, self.dir_mtimes = data["files"], data["dir_mtimes"]
+                if self.is_valid():
+                    return
+            self.build()
+            shared_cache.atomic_write_json(self.cache_file, {
+                "search_path": self.search_path, "files": self.files, "dir_mtimes": self.dir_mtimes
+            })
+
+    def build(self):
+        files, dir_mtimes = {}, {}
+        for root, dirs, file_names in os.walk(self.search_path):
+            dir_mtimes[root] = os.stat(root).st_mtime_ns
+            for file_name in file_names:
+                # Paths keep os.walk order, so the first one is what the old find_file returned
+                files.setdefault(file_name, []).append(os.path.join(root, file_name))
+        self.files, self.dir_mtimes = files, dir_mtimes
+        self._checked_at = time.monotonic()
+        logger.info(f"Indexed {sum(len(paths) for paths in files.values())} files under {self.search_path}")
+        for file_name, paths in self.duplicates().items():
+            logger.warning(f"Duplicate file name {file_name} under {self.search_path}, using {paths[0]} of {paths}")
+
+    def is_valid(self):
+        if not self.dir_mtimes:
+            # A missing search root may have been created since
+            return not os.path.isdir(self.search_path)
+        for directory, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def refresh_if_stale(self, force=False):
+        if not force and time.monotonic() - self._checked_at < self.recheck_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not self.is_valid():
+                logger.info(f"Files under {self.search_path} changed, rebuilding index")
+                self.load()
+
+def get_index(search_path):
+    key = os.path.normpath(search_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileIndex(search_path)
+            _indexes[key] = index
+        return index
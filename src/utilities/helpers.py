@@ -1,13 +1,15 @@
 import json
 import os
 from pathlib import Path
-import pandas as pd
 from src.configs import configurations
-from src.utilities import customlogger
+from src.utilities import columnar, customlogger, file_index
 import pytest
 
 logger = customlogger.custom_logger()
 
+# Parsed Examples row stored on each Scenario Outline item
+EXAMPLE_PARAMS = pytest.StashKey[dict]()
+
 def verify_file_exists(folder_location, file_name):
     file_path = configurations.get_relative_path(folder_location, file_name)
     try:
@@ -19,69 +21,45 @@ def verify_file_exists(folder_location, file_name):
         logger.error(f"{e}")
 
 def find_file(file_name, search_path):
-    for root, dirs, files in os.walk(search_path):
-        if file_name in files:
-            return os.path.join(root, file_name)
-    return None
+    # The search path is walked once and indexed, later lookups are dictionary reads
+    return file_index.get_index(search_path).find(file_name)
 
+# pandas and the modules built on it are imported by the functions that need them, so importing
+# helpers (conftest, collection hooks) stays cheap
+# Files may be CSV, Parquet (.parquet) or Arrow IPC (.arrow/.feather); the columnar formats are memory mapped
 def compare_row_count_of_files(file_1, file_2):
-    df1 = pd.read_csv(file_1)
-    df2 = pd.read_csv(file_2)
-    if df1.shape == df2.shape:
+    # Parquet shapes come from the file footer without reading any data
+    if columnar.shape(file_1) == columnar.shape(file_2):
         return True
     else:
         return False
 
-def generate_column_wise_counts(csv_file):
-    df = pd.read_csv(csv_file)
-    columns = df.columns
-    counts, null_counts, distinct_counts, min_values, max_values = [], [], [], [], []
-
-    for column in columns:
-        # Count the number of non-null values in the column
-        counts.append(df[column].count())
-        # Count the number of null values in the column
-        null_counts.append(df[column].isnull().sum())
-        # Count the number of unique values in the column
-        distinct_counts.append(df[column].nunique())
-
-        try:
-            # Select the string values in the column
-            string_values = df[column].select_dtypes(include="object")
-            if not string_values.empty:
-                # Get the minimum and maximum string lengths
-                min_values.append(string_values.str.len().min())
-                max_values.append(string_values.str.len().max())
-            else:
-                min_values.append("Null")
-                max_values.append("Null")
-        except Exception as e:
-            logger.info(f"An error occurred while processing column '{column}': {e}")
-            min_values.append("Null")
-            max_values.append("Null")
-
-    # Create a dataframe with the counts
-    result_df = pd.DataFrame({
-        "Column": columns,
-        "Count": counts,
-        "Null Count": null_counts,
-        "Distinct Count": distinct_counts,
-        "Min Value (length)": min_values,
-        "Max Value (length)": max_values
-    })
-
-    return result_df
-
-def compare_dataframes(csv_1_path, csv_2_path):
-    df1 = pd.read_csv(csv_1_path)
-    df2 = pd.read_csv(csv_2_path)
-    return df1.apply(tuple, 1).isin(df2.apply(tuple, 1))
+def generate_column_wise_counts(csv_file, chunksize=None, approximate_distinct=False, columns=None):
+    # Count, null count, distinct count and min/max string length of every column. With a chunksize
+    # (or PROFILE_CHUNK_SIZE) the file is profiled chunk by chunk in bounded memory, and
+    # approximate_distinct swaps the exact distinct count for a HyperLogLog estimate
+    from src.utilities import column_profiler
+    return column_profiler.profile_csv(csv_file, chunksize=chunksize, approximate_distinct=approximate_distinct, columns=columns)
+
+def compare_dataframes(csv_1_path, csv_2_path, columns=None):
+    # Accepts file paths, Arrow tables or DataFrames, rows are matched by vectorized row hashes
+    from src.utilities import row_diff
+    return row_diff.rows_in(columnar.read_frame(csv_1_path, columns), columnar.read_frame(csv_2_path, columns))
+
+def diff_files(source_csv, target_csv, key_columns=None, summary_only=False, chunksize=None):
+    # Streams both extracts and returns a RowDiff with missing/extra rows and, with key columns,
+    # per-column mismatches. summary_only skips the second pass and returns only the counts.
+    # Files are compared as exact text, so "001" and "1" or "1.0" and "1" are different values,
+    # while compare_dataframes compares the numeric columns it infers by value
+    from src.utilities import row_diff
+    return row_diff.diff_files(source_csv, target_csv, key_columns=key_columns, summary_only=summary_only, chunksize=chunksize)
 
 def compare_dataframes_counts(csv_file1, csv_file2):
     # Generate counts for each dataframe and compare them
     return compare_dataframes(generate_column_wise_counts(csv_file1), generate_column_wise_counts(csv_file2))
 
 def compare_schemas(df1, df2, output_folder, mismatching_columns_csv_file):
+    import pandas as pd
     # Check if either of the input DataFrames is empty
     if df1.empty or df2.empty:
         raise ValueError("One or both input DataFrames are empty")
@@ -112,6 +90,20 @@ def compare_schemas(df1, df2, output_folder, mismatching_columns_csv_file):
     # If all data types match, return True
     return True
 
+# Pushdown versions of the checks above, run as one summary query per table in Teradata so only
+# the summary frame is transferred. Tables are named "Database.Table" or given with database
+def generate_table_column_wise_counts(db_helper, table, database=None, columns=None, where=None):
+    from src.utilities import pushdown_profiler
+    return pushdown_profiler.profile_table(db_helper, table, database, columns, where).profile
+
+def compare_tables(db_helper, source_table, target_table, database=None, where=None):
+    from src.utilities import pushdown_profiler
+    return pushdown_profiler.compare_tables(db_helper, source_table, target_table, database, where=where)
+
+def compare_table_schemas(db_helper, source_table, target_table, database=None):
+    from src.utilities import pushdown_profiler
+    return pushdown_profiler.compare_table_schemas(db_helper, source_table, target_table, database)
+
 def convert_json_to_dict(json_file_location):
     json_file = Path(json_file_location)
     if json_file.exists():
@@ -120,17 +112,21 @@ def convert_json_to_dict(json_file_location):
     else:
         raise FileNotFoundError
 
+def get_example_params(item):
+    # Examples row of a pytest-bdd Scenario Outline item, with the %SEP% list separator expanded.
+    # Built once per item, collection hooks, fixtures and batchers all ask for it
+    params = item.stash.get(EXAMPLE_PARAMS, None)
+    if params is None:
+        params = {key: str(value).replace(' %SEP% ', ', ') for key, value in item.callspec.params['_pytest_bdd_example'].items()}
+        item.stash[EXAMPLE_PARAMS] = params
+    return params
+
 def read_data_table_from_feature_file(table_with_headers):
-    list_table_rows = table_with_headers.split("\n")
-    list_headers = str(list_table_rows[0]).strip("|").split("|")
-    dict_table = {}
-    for header in list_headers:
-        header_text = header.strip()
-        lst_row = []
-        for i in range(1, list_table_rows.__len__()):
-            list_temp = list_table_rows[i].strip("|").split("|")
-            lst_row.append(list_temp[list_headers.index(header)].strip())
-
-        dict_table[header_text] = lst_row
-
-    return dict_table
+    # Every row is split once and its cells appended to the columns by position
+    rows = [row.strip("|").split("|") for row in table_with_headers.split("\n")]
+    headers = [header.strip() for header in rows[0]]
+    columns = [[] for _ in headers]
+    for row in rows[1:]:
+        for position, column in enumerate(columns):
+            column.append(row[position].strip())
+    return dict(zip(headers, columns))
@@ -3,65 +3,56 @@ import os
 import sys
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured when run as a script, so importing the module from pytest leaves the root logger alone
 logger = logging.getLogger(__name__)
 
-def process_and_summarize_results(results_dir):
+# Records the status of every result file already processed, so re-runs only handle new results
+MANIFEST_FILE = ".processed-results.json"
+# Below this many new files a process pool costs more to start than it saves
+PARALLEL_THRESHOLD = 200
+
+def process_and_summarize_results(results_dir, workers=None):
     """Process Allure results and summarize test statuses in a single iteration."""
     status_counts = {"passed": 0, "failed": 0, "broken": 0, "skipped": 0, "unknown": 0}
     modified_count = 0
     skipped_count = 0
     try:
-        for filename in os.listdir(results_dir):
-            if filename.endswith(".json"):
-                filepath = os.path.join(results_dir, filename)
-                try:
-                    with open(filepath, "r") as file:
-                        data = json.load(file)
-                except json.JSONDecodeError:
-                    logger.error(f"Skipping invalid JSON file: {filepath}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Error reading file {filepath}: {e}")
-                    continue
-
-                # Process and modify results if necessary
-                try:
-                    modified, new_status = modify_and_update_result(data)
-                except Exception as e:
-                    logger.error(f"Error processing file {filepath}: {e}")
-                    continue
-
-                # Check for missing or empty status
-                if not new_status:
-                    logger.warning(f"Empty status in file {filepath}")
-                    new_status = infer_status_from_steps(data)
-                    data["status"] = new_status  # Ensure status is set at the top level
-
-                # Update status count (either modified status or original status)
-                if new_status in status_counts:
-                    status_counts[new_status] += 1
-                else:
-                    logger.warning(f"Unknown status '{new_status}' in file {filepath}")
-                    status_counts["unknown"] += 1
-
-                # Save modified results back to file if any modification occurred
-                if modified:
-                    try:
-                        with open(filepath, "w") as file:
-                            json.dump(data, file, indent=4)
-                        modified_count += 1
-                    except Exception as e:
-                        logger.error(f"Error writing file {filepath}: {e}")
-                        continue
-
-                # Count skipped tests with logging
-                if new_status == "skipped":
-                    reason = data.get("statusDetails", {}).get("message", "No reason provided")
-                    logger.info(f"Test skipped due to long execution time: {reason}")
-                    skipped_count += 1
+        manifest = load_manifest(results_dir)
+        # Only test results carry a status, containers and attachments are never opened
+        result_files = {}
+        with os.scandir(results_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith("-result.json"):
+                    result_files[entry.name] = entry.stat().st_mtime_ns
+        pending = [
+            os.path.join(results_dir, filename) for filename, mtime in result_files.items()
+            if manifest.get(filename, {}).get("mtime") != mtime
+        ]
+        logger.info(f"Found {len(result_files)} result files, {len(pending)} not processed yet.")
+
+        for filename, status, modified, mtime, reason in process_result_files(pending, workers):
+            if status is None:
+                continue
+            manifest[filename] = {"status": status, "mtime": mtime}
+            if modified:
+                modified_count += 1
+            # Count skipped tests with logging
+            if status == "skipped":
+                logger.info(f"Test skipped due to long execution time: {reason}")
+                skipped_count += 1
+
+        # Result files removed since the last run no longer count
+        manifest = {filename: entry for filename, entry in manifest.items() if filename in result_files}
+        for filename, entry in manifest.items():
+            if entry["status"] in status_counts:
+                status_counts[entry["status"]] += 1
+            else:
+                logger.warning(f"Unknown status '{entry['status']}' in file {filename}")
+                status_counts["unknown"] += 1
+        save_manifest(results_dir, manifest)
+
         logger.info(f"Modified {modified_count} files with status updates.")
         logger.info(f"Logged {skipped_count} skipped tests.")
         logger.info(
@@ -75,6 +66,72 @@ def process_and_summarize_results(results_dir):
         logger.error(f"Unexpected error during processing: {e}")
         sys.exit(1)
 
+def process_result_files(filepaths, workers=None):
+    """Process result files, spreading them over a process pool when there are many."""
+    if len(filepaths) < PARALLEL_THRESHOLD or workers == 1:
+        return [process_result_file(filepath) for filepath in filepaths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(filepaths) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(process_result_file, filepaths, chunksize=chunksize))
+
+def process_result_file(filepath):
+    """Parse, reclassify and rewrite one result file, returning its name, status and modification."""
+    filename = os.path.basename(filepath)
+    try:
+        with open(filepath, "r") as file:
+            data = json.load(file)
+    except json.JSONDecodeError:
+        logger.error(f"Skipping invalid JSON file: {filepath}")
+        return filename, None, False, None, None
+    except Exception as e:
+        logger.error(f"Error reading file {filepath}: {e}")
+        return filename, None, False, None, None
+
+    # Process and modify results if necessary
+    try:
+        modified, new_status = modify_and_update_result(data)
+    except Exception as e:
+        logger.error(f"Error processing file {filepath}: {e}")
+        return filename, None, False, None, None
+
+    # Check for missing or empty status
+    if not new_status:
+        logger.warning(f"Empty status in file {filepath}")
+        new_status = infer_status_from_steps(data)
+        data["status"] = new_status  # Ensure status is set at the top level
+
+    # Save modified results back to file if any modification occurred
+    if modified:
+        try:
+            atomic_write_json(filepath, data)
+        except Exception as e:
+            logger.error(f"Error writing file {filepath}: {e}")
+            modified = False
+
+    reason = data.get("statusDetails", {}).get("message", "No reason provided")
+    return filename, new_status, modified, os.stat(filepath).st_mtime_ns, reason
+
+def atomic_write_json(filepath, data):
+    """Write JSON compactly to a temporary file and rename it over the original."""
+    temp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(temp_path, filepath)
+
+def load_manifest(results_dir):
+    """Load the statuses of previously processed result files."""
+    try:
+        with open(os.path.join(results_dir, MANIFEST_FILE), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(results_dir, manifest):
+    try:
+        atomic_write_json(os.path.join(results_dir, MANIFEST_FILE), manifest)
+    except Exception as e:
+        logger.error(f"Error writing manifest: {e}")
+
 def modify_and_update_result(data):
     """Modify the result if applicable and return modified flag and updated status."""
     status = data.get("status", "").lower()
@@ -149,6 +206,8 @@ def create_allure_categories(results_dir):
         logger.error(f"Error creating categories.json: {e}")
 
 if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
     # Argument parser to get path from command line
     parser = argparse.ArgumentParser(
         description="Process and modify Allure results JSON files."
@@ -156,9 +215,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--path", required=True, help="Path to the allure-results directory."
     )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of processes used to process result files."
+    )
     args = parser.parse_args()
     results_dir = args.path
     # Process, modify, and summarize Allure results in one iteration
-    process_and_summarize_results(results_dir)
+    process_and_summarize_results(results_dir, args.workers)
     # Create categories.json for enhanced Allure categorization
     create_allure_categories(results_dir)
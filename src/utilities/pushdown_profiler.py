@@ -0,0 +1,185 @@
+import os
+from src.utilities import customlogger
+
+logger = customlogger.custom_logger()
+
+# DBC.ColumnsV ColumnType codes and the names compare_schemas reports them under
+COLUMN_TYPES = {
+    "A1": "ARRAY", "AN": "ARRAY", "AT": "TIME", "BF": "BYTE", "BO": "BLOB", "BV": "VARBYTE",
+    "CF": "CHAR", "CO": "CLOB", "CV": "VARCHAR", "D": "DECIMAL", "DA": "DATE", "DH": "INTERVAL DAY TO HOUR",
+    "DM": "INTERVAL DAY TO MINUTE", "DS": "INTERVAL DAY TO SECOND", "DY": "INTERVAL DAY", "F": "FLOAT",
+    "HM": "INTERVAL HOUR TO MINUTE", "HR": "INTERVAL HOUR", "HS": "INTERVAL HOUR TO SECOND", "I1": "BYTEINT",
+    "I2": "SMALLINT", "I8": "BIGINT", "I": "INTEGER", "JN": "JSON", "MI": "INTERVAL MINUTE", "MO": "INTERVAL MONTH",
+    "MS": "INTERVAL MINUTE TO SECOND", "N": "NUMBER", "PD": "PERIOD(DATE)", "PM": "PERIOD(TIMESTAMP WITH TIME ZONE)",
+    "PS": "PERIOD(TIMESTAMP)", "PT": "PERIOD(TIME)", "PZ": "PERIOD(TIME WITH TIME ZONE)", "SC": "INTERVAL SECOND",
+    "SZ": "TIMESTAMP WITH TIME ZONE", "TS": "TIMESTAMP", "TZ": "TIME WITH TIME ZONE", "UT": "UDT", "XM": "XML",
+    "YM": "INTERVAL YEAR TO MONTH", "YR": "INTERVAL YEAR",
+}
+CHARACTER_TYPES = {"CF", "CV"}
+# Large object and structured types cannot be compared, so they get no distinct count and no row hash
+UNCOMPARABLE_TYPES = {"A1", "AN", "BO", "CO", "JN", "UT", "XM"}
+
+# HASHROW takes a limited number of expressions, wider tables are hashed in groups of columns
+HASHROW_MAX_COLUMNS = 50
+
+class TableSummary:
+    """Profile of a table computed in the database: per-column counts plus a row count and checksum."""
+
+    def __init__(self, table, profile, row_count, checksum):
+        self.table = table
+        self.profile = profile
+        self.row_count = row_count
+        self.checksum = checksum
+
+def split_name(table, database=None):
+    # Accepts "Database.Table" or a bare table name with the database passed separately
+    if "." in table:
+        database, table = table.split(".", 1)
+    if not database:
+        raise ValueError(f"No database given for table {table}")
+    return database.strip(), table.strip()
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def run_sql(db_helper, sql, timeout=1800, use_cache=True):
+    # Summary queries share the caller's session, like the table catalog lookups
+    with db_helper.borrowed_session() as helper:
+        result = helper.execute_query(sql, timeout=timeout, label="pushdown profile", use_cache=use_cache)
+    if isinstance(result, Exception) or result is None:
+        raise RuntimeError(f"Pushdown query failed: {result}")
+    return result
+
+def columns_sql(database, table):
+    return (
+        "SELECT TRIM(ColumnName) AS ColumnName, TRIM(ColumnType) AS ColumnType, ColumnLength, "
+        "DecimalTotalDigits, DecimalFractionalDigits, Nullable FROM DBC.ColumnsV "
+        f"WHERE DatabaseName = '{database}' AND TableName = '{table}' ORDER BY ColumnId;"
+    )
+
+def table_columns(db_helper, table, database=None, timeout=1800):
+    # Column names and types from the data dictionary, without reading any table data. Never served
+    # from the result cache, its alter time check covers DBC.ColumnsV and not the table described
+    database, table = split_name(table, database)
+    columns = run_sql(db_helper, columns_sql(database, table), timeout=timeout, use_cache=False)
+    if columns.empty:
+        raise ValueError(f"Table {database}.{table} not found in DBC.ColumnsV")
+    return columns
+
+def table_schema(db_helper, table, database=None, timeout=1800):
+    # Column and type name frame in the shape compare_schemas builds from a DataFrame
+    columns = table_columns(db_helper, table, database, timeout)
+    types = []
+    for row in columns.itertuples(index=False):
+        type_name = COLUMN_TYPES.get(row.ColumnType, row.ColumnType)
+        if row.ColumnType in CHARACTER_TYPES or row.ColumnType in ("BF", "BV"):
+            type_name = f"{type_name}({int(row.ColumnLength)})"
+        elif row.ColumnType in ("D", "N") and row.DecimalTotalDigits is not None:
+            type_name = f"{type_name}({int(row.DecimalTotalDigits)},{int(row.DecimalFractionalDigits)})"
+        types.append(type_name)
+    import pandas as pd
+    return pd.DataFrame({"Column": columns["ColumnName"].tolist(), "Type": types})
+
+def profile_sql(database, table, columns, where=None):
+    # One SELECT computing every column's counts and lengths plus a row count and an order
+    # independent checksum (sum of the row hash buckets), so only one summary row is returned
+    expressions = ["COUNT(*) AS row_cnt"]
+    hashed = []
+    for position, (name, column_type) in enumerate(columns):
+        column = quote(name)
+        expressions.append(f"COUNT({column}) AS c{position}_cnt")
+        if column_type in UNCOMPARABLE_TYPES:
+            expressions.append(f"CAST(NULL AS BIGINT) AS c{position}_dst")
+        else:
+            expressions.append(f"COUNT(DISTINCT {column}) AS c{position}_dst")
+            hashed.append(column)
+        if column_type in CHARACTER_TYPES:
+            # CHAR values are padded to their declared length, so trailing blanks are not counted
+            length = f"CHARACTER_LENGTH(TRIM(TRAILING FROM {column}))" if column_type == "CF" else f"CHARACTER_LENGTH({column})"
+            expressions.append(f"MIN({length}) AS c{position}_min")
+            expressions.append(f"MAX({length}) AS c{position}_max")
+    if hashed:
+        groups = [hashed[start:start + HASHROW_MAX_COLUMNS] for start in range(0, len(hashed), HASHROW_MAX_COLUMNS)]
+        buckets = " + ".join(f"CAST(HASHBUCKET(HASHROW({', '.join(group)})) AS DECIMAL(38,0))" for group in groups)
+        expressions.append(f"SUM({buckets}) AS row_checksum")
+    else:
+        expressions.append("CAST(NULL AS DECIMAL(38,0)) AS row_checksum")
+    sql = "SELECT\n    " + ",\n    ".join(expressions) + f"\nFROM {quote(database)}.{quote(table)}"
+    if where:
+        sql += f"\nWHERE {where}"
+    return sql + ";"
+
+def summary_from_row(table, columns, row):
+    import pandas as pd
+    from src.utilities import column_profiler
+    row = {key.lower(): value for key, value in row.items()}
+    row_count = int(row["row_cnt"])
+    records = []
+    for position, (name, column_type) in enumerate(columns):
+        count = int(row[f"c{position}_cnt"])
+        distinct = row[f"c{position}_dst"]
+        records.append([
+            name, count, row_count - count, None if pd.isna(distinct) else int(distinct),
+            column_profiler.format_length(row.get(f"c{position}_min")),
+            column_profiler.format_length(row.get(f"c{position}_max")),
+        ])
+    checksum = row["row_checksum"]
+    checksum = None if pd.isna(checksum) else int(checksum)
+    profile = pd.DataFrame(records, columns=column_profiler.PROFILE_COLUMNS)
+    # Nullable integers, so a column without a distinct count does not turn the others into floats
+    profile["Distinct Count"] = profile["Distinct Count"].astype("Int64")
+    return TableSummary(table, profile, row_count, checksum)
+
+def profile_table(db_helper, table, database=None, columns=None, where=None, timeout=None):
+    # Same columns as generate_column_wise_counts, computed where the data lives. Min/max lengths
+    # are reported for character columns, every other type reports "Null"
+    timeout = timeout or int(os.getenv("SQL_QUERY_TIMEOUT", "1800"))
+    database, table = split_name(table, database)
+    metadata = table_columns(db_helper, table, database, timeout)
+    selected = [(row.ColumnName, row.ColumnType) for row in metadata.itertuples(index=False)
+                if columns is None or row.ColumnName.casefold() in {column.casefold() for column in columns}]
+    result = run_sql(db_helper, profile_sql(database, table, selected, where), timeout=timeout)
+    return summary_from_row(f"{database}.{table}", selected, result.iloc[0].to_dict())
+
+def compare_tables(db_helper, source, target, database=None, columns=None, where=None, timeout=None):
+    # Compares row counts, checksums and column profiles of two tables without moving their rows.
+    # Columns both tables have are compared in the source table's order, source columns the target
+    # lacks are listed in missing_columns and make the tables differ
+    source_summary = profile_table(db_helper, source, database, columns, where, timeout)
+    target_summary = profile_table(db_helper, target, database, columns or list(source_summary.profile["Column"]), where, timeout)
+    target_columns = set(target_summary.profile["Column"].str.casefold())
+    missing_columns = [column for column in source_summary.profile["Column"] if column.casefold() not in target_columns]
+    if missing_columns:
+        logger.warning(f"Columns missing from {target_summary.table}: {missing_columns}")
+
+    source_profile = source_summary.profile.assign(key=source_summary.profile["Column"].str.casefold())
+    target_profile = target_summary.profile.assign(key=target_summary.profile["Column"].str.casefold())
+    merged = source_profile.merge(target_profile, on="key", suffixes=(" (source)", " (target)"))
+    compared = ["Count", "Null Count", "Distinct Count", "Min Value (length)", "Max Value (length)"]
+    differs = merged[[f"{name} (source)" for name in compared]].astype(str).to_numpy() != merged[[f"{name} (target)" for name in compared]].astype(str).to_numpy()
+    column_differences = merged[differs.any(axis=1)].drop(columns=["key", "Column (target)"]).rename(columns={"Column (source)": "Column"})
+    return {
+        "source": source_summary.table,
+        "target": target_summary.table,
+        "source_rows": source_summary.row_count,
+        "target_rows": target_summary.row_count,
+        "source_checksum": source_summary.checksum,
+        "target_checksum": target_summary.checksum,
+        "matches": source_summary.row_count == target_summary.row_count
+                   and source_summary.checksum == target_summary.checksum
+                   and column_differences.empty
+                   and not missing_columns,
+        "column_differences": column_differences.reset_index(drop=True),
+        "missing_columns": missing_columns,
+    }
+
+def compare_table_schemas(db_helper, source, target, database=None, timeout=None):
+    # Mismatching column types read from DBC.ColumnsV, empty when the schemas match
+    timeout = timeout or int(os.getenv("SQL_QUERY_TIMEOUT", "1800"))
+    source_schema = table_schema(db_helper, source, database, timeout)
+    target_schema = table_schema(db_helper, target, database, timeout)
+    merged = source_schema.assign(key=source_schema["Column"].str.casefold()).merge(
+        target_schema.assign(key=target_schema["Column"].str.casefold()), on="key", how="outer", suffixes=("_df1", "_df2")
+    )
+    merged["Column"] = merged["Column_df1"].fillna(merged["Column_df2"])
+    return merged.loc[merged["Type_df1"] != merged["Type_df2"], ["Column", "Type_df1", "Type_df2"]].reset_index(drop=True)
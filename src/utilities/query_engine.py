@@ -0,0 +1,279 @@
+import asyncio
+import os
+import threading
+import pytest
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from src.utilities import customlogger
+
+logger = customlogger.custom_logger()
+
+# Engines are tracked so the session teardown can stop them before the connection pools close
+_engines = []
+_engines_lock = threading.Lock()
+
+class QueryEngine:
+    """Keep several queries in flight per worker, each on its own pooled session."""
+
+    # The Teradata drivers block, so queries run on a thread pool and are exposed
+    # as concurrent futures or, through the *_async methods, as asyncio awaitables.
+    # The scenario keeps one pooled session for itself, so at most pool size - 1 queries run on
+    # the engine's threads. With a pool of one there are none and queries run on the caller's
+    # session when submitted, as waiting for a second session would never end
+    def __init__(self, db_helper, max_workers=None):
+        self.db_helper = db_helper
+        requested = max_workers or int(os.getenv("SQL_CONCURRENCY", db_helper.pool.max_size))
+        self.max_workers = max(0, min(requested, db_helper.pool.max_size - 1))
+        self.executor = None
+        if self.max_workers:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query-engine")
+        else:
+            logger.info("Connection pool has a single session, queries run one at a time on the caller's session")
+        with _engines_lock:
+            _engines.append(self)
+
+    @property
+    def concurrent(self):
+        return self.executor is not None
+
+    def submit(self, query, **query_kwargs):
+        return self._submit(query, query_kwargs, False)
+
+    def submit_timed(self, query, **query_kwargs):
+        # The future resolves to (result, metrics dict of the query)
+        return self._submit(query, query_kwargs, True)
+
+    def _submit(self, query, query_kwargs, timed):
+        if self.concurrent:
+            return self.executor.submit(self._run, query, query_kwargs, timed)
+        future = Future()
+        try:
+            future.set_result(self._run_borrowed(query, query_kwargs, timed))
+        except BaseException as ex:
+            future.set_exception(ex)
+        return future
+
+    def map(self, queries, **query_kwargs):
+        # Results are yielded in submission order
+        futures = [self.submit(query, **query_kwargs) for query in queries]
+        for future in futures:
+            yield future.result()
+
+    def as_completed(self, queries, **query_kwargs):
+        # Yields (query, result) pairs in the order the queries finish
+        futures = {self.submit(query, **query_kwargs): query for query in queries}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    async def execute_async(self, query, **query_kwargs):
+        return await asyncio.wrap_future(self.submit(query, **query_kwargs))
+
+    async def gather_async(self, queries, **query_kwargs):
+        return await asyncio.gather(*(self.execute_async(query, **query_kwargs) for query in queries))
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+        with _engines_lock:
+            if self in _engines:
+                _engines.remove(self)
+
+    def _run(self, query, query_kwargs, timed=False):
+        # Each in-flight query gets its own helper so sessions are never shared between threads
+        helper = self.db_helper.clone()
+        helper.connect()
+        try:
+            result = helper.execute_query(query, **query_kwargs)
+            return (result, metrics_of(helper)) if timed else result
+        finally:
+            helper.close_connection()
+
+    def _run_borrowed(self, query, query_kwargs, timed):
+        with self.db_helper.borrowed_session() as helper:
+            result = helper.execute_query(query, **query_kwargs)
+            return (result, metrics_of(helper)) if timed else result
+
+class OutlinePrefetcher:
+    """Submit the query of every Examples row of a Scenario Outline up front."""
+
+    # prepare_func(item) returns (sql, query_kwargs) for a collected item, or None when the
+    # item has nothing to run. The When step calls get() for its own item, which submits the
+    # rows ahead of it in the same outline and waits for its own result and query metrics
+    def __init__(self, engine, prepare_func, window=None):
+        self.engine = engine
+        self.prepare_func = prepare_func
+        self.window = window or int(os.getenv("SQL_PREFETCH_WINDOW", "100"))
+        self.pending = {}
+        self._positions = None
+        self._enabled = None
+
+    def get(self, item):
+        if self._enabled is None:
+            self._enabled = outline_stays_on_worker(item.config) and self.engine.concurrent
+            if not outline_stays_on_worker(item.config):
+                logger.warning(f"Prefetch disabled under --dist {item.config.getoption('dist')}, use loadfile, loadscope or loadgroup")
+            elif not self._enabled:
+                logger.warning("Prefetch disabled, TD_POOL_SIZE must leave a session besides the scenario's own")
+        if item.nodeid not in self.pending:
+            if self._enabled:
+                self._submit_outline(item)
+            else:
+                sql, query_kwargs = self.prepare_func(item)
+                self.pending[item.nodeid] = (sql, self.engine.submit_timed(sql, **query_kwargs))
+        sql, future = self.pending.pop(item.nodeid)
+        result, metrics = future.result()
+        return sql, result, metrics
+
+    def _submit_outline(self, item):
+        items = item.session.items
+        if self._positions is None:
+            self._positions = {collected.nodeid: index for index, collected in enumerate(items)}
+
+        submitted = 0
+        for sibling in items[self._positions.get(item.nodeid, 0):]:
+            if submitted >= self.window:
+                break
+            if not is_same_outline(sibling, item) or not is_same_group(sibling, item) or sibling.nodeid in self.pending:
+                continue
+            prepared = self.prepare_func(sibling)
+            if prepared is None:
+                continue
+            sql, query_kwargs = prepared
+            self.pending[sibling.nodeid] = (sql, self.engine.submit_timed(sql, **query_kwargs))
+            submitted += 1
+        logger.info(f"Prefetched {submitted} Examples rows of {item.originalname}")
+
+        if item.nodeid not in self.pending:
+            sql, query_kwargs = self.prepare_func(item)
+            self.pending[item.nodeid] = (sql, self.engine.submit_timed(sql, **query_kwargs))
+
+class OutlineBatcher:
+    """Run the queries of many Examples rows of an outline in a single round trip."""
+
+    # Rows are grouped batch_size at a time and sent with TeradataHelper.execute_batch, either as
+    # one multi-statement request or, in "union" mode, as one UNION ALL split back by key_func(item).
+    # A batch that errors is re-run row by row so one bad query cannot fail its neighbours. Rows of
+    # a batch share its metrics, with batch_rows set so a row's share of the time can be worked out
+    def __init__(self, db_helper, prepare_func, batch_size=None, mode=None, key_func=None, key_column="Test_Cd"):
+        self.db_helper = db_helper
+        self.prepare_func = prepare_func
+        self.batch_size = batch_size or int(os.getenv("SQL_BATCH_SIZE", "50"))
+        self.mode = mode or os.getenv("SQL_BATCH_MODE", "multistatement")
+        self.key_func = key_func
+        self.key_column = key_column
+        self.results = {}
+        self._positions = None
+        self._enabled = None
+
+    def get(self, item):
+        if self._enabled is None:
+            self._enabled = outline_stays_on_worker(item.config)
+            if not self._enabled:
+                logger.warning(f"Batching disabled under --dist {item.config.getoption('dist')}, use loadfile, loadscope or loadgroup")
+        if item.nodeid not in self.results:
+            self._run_batch(item)
+        sql, result, metrics = self.results.pop(item.nodeid)
+        if isinstance(result, BaseException):
+            raise result
+        return sql, result, metrics
+
+    def _collect_batch(self, item):
+        if not self._enabled:
+            return [(item, self.key_func(item) if self.key_func else None, self.prepare_func(item))]
+        items = item.session.items
+        if self._positions is None:
+            self._positions = {collected.nodeid: index for index, collected in enumerate(items)}
+
+        batch, keys = [], set()
+        for sibling in items[self._positions.get(item.nodeid, 0):]:
+            if len(batch) >= self.batch_size:
+                break
+            if not is_same_outline(sibling, item) or not is_same_group(sibling, item) or sibling.nodeid in self.results:
+                continue
+            prepared = self.prepare_func(sibling)
+            if prepared is None:
+                continue
+            key = self.key_func(sibling) if self.key_func else None
+            # Rows sharing a split key cannot be told apart in a UNION ALL, so they go in a later batch
+            if self.mode == "union" and key in keys:
+                continue
+            keys.add(key)
+            batch.append((sibling, key, prepared))
+
+        if item.nodeid not in [sibling.nodeid for sibling, _, _ in batch]:
+            prepared = self.prepare_func(item)
+            batch = [(item, self.key_func(item) if self.key_func else None, prepared)]
+        return batch
+
+    def _run_batch(self, item):
+        batch = self._collect_batch(item)
+        queries = [sql for _, _, (sql, _) in batch]
+        timeout = max(query_kwargs.get("timeout", 1800) for _, _, (_, query_kwargs) in batch)
+        max_rows = batch[0][2][1].get("max_rows")
+        labels = sorted({str(query_kwargs["label"]) for _, _, (_, query_kwargs) in batch if query_kwargs.get("label")})
+        label = f"{', '.join(labels)} (batch of {len(batch)})" if labels else None
+
+        # Runs on the scenario's own session, a second one would never free up with TD_POOL_SIZE=1
+        with self.db_helper.borrowed_session() as helper:
+            try:
+                results = helper.execute_batch(
+                    queries, timeout=timeout, max_rows=max_rows, mode=self.mode,
+                    key_column=self.key_column, keys=[key for _, key, _ in batch], label=label,
+                )
+            except pytest.skip.Exception as ex:
+                # A timed out batch skips every row in it, the same way a single query would
+                results = [ex] * len(batch)
+            except Exception as ex:
+                results = ex
+
+            if isinstance(results, Exception) or results is None:
+                logger.info(f"Batch of {len(batch)} rows failed, running them individually: {results}")
+                results, metrics = [], []
+                for _, _, (sql, query_kwargs) in batch:
+                    results.append(run_individually(helper, sql, query_kwargs))
+                    metrics.append(metrics_of(helper))
+            else:
+                logger.info(f"Ran {len(batch)} Examples rows of {item.originalname} in one request")
+                batch_metrics = metrics_of(helper)
+                if batch_metrics is not None:
+                    batch_metrics["batch_rows"] = len(batch)
+                metrics = [batch_metrics] * len(batch)
+
+        for (sibling, _, (sql, _)), result, row_metrics in zip(batch, results, metrics):
+            self.results[sibling.nodeid] = (sql, result, row_metrics)
+
+def run_individually(helper, sql, query_kwargs):
+    try:
+        return helper.execute_query(sql, **query_kwargs)
+    except pytest.skip.Exception as ex:
+        return ex
+
+def metrics_of(helper):
+    # Timings of the helper's last query, None when it never reached the database
+    return helper.metrics.as_dict() if helper.metrics is not None else None
+
+def is_same_outline(item, other):
+    return item.path == other.path and getattr(item, "originalname", None) == getattr(other, "originalname", None)
+
+def outline_stays_on_worker(config):
+    # Every worker collects the whole session, but under --dist load or worksteal the rows of an
+    # outline are spread over the workers, so queries taken from session.items would run on several.
+    # loadfile and loadscope send a whole feature module to one worker, loadgroup an xdist_group
+    if not hasattr(config, "workerinput"):
+        return True
+    return config.getoption("dist") in ("loadfile", "loadscope", "loadgroup")
+
+def is_same_group(item, other):
+    # Under loadgroup only rows marked with the same xdist_group stay together, xdist appends the group to the node id
+    if not hasattr(item.config, "workerinput") or item.config.getoption("dist") != "loadgroup":
+        return True
+    return "@" in item.nodeid and item.nodeid.rpartition("@")[2] == other.nodeid.rpartition("@")[2]
+
+def resolve(result):
+    # Steps may receive either a ready result or a future from the engine
+    return result.result() if isinstance(result, Future) else result
+
+def shutdown_all():
+    with _engines_lock:
+        engines = list(_engines)
+    for engine in engines:
+        engine.shutdown(wait=False)
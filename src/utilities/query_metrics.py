@@ -0,0 +1,154 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from src.configs import configurations
+
+PHASES = ("connect", "admission", "execute", "fetch", "to_dataframe", "total")
+PERCENTILES = (50, 90, 95, 99)
+
+_write_lock = threading.Lock()
+
+class QueryTimer:
+    """Per-phase timings, row count and size estimate of a single query."""
+
+    def __init__(self, query=None, label=None):
+        self.label = label
+        self.query_hash = hashlib.sha1(query.encode()).hexdigest()[:12] if query else None
+        self.phases = {}
+        self.rows = 0
+        self.bytes = 0
+        self.status = "passed"
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_result(self, df):
+        # Deep memory usage walks every Python string, so large results fall back to the shallow estimate.
+        # Arrow tables know their buffer size
+        self.rows += len(df)
+        if hasattr(df, "nbytes") and hasattr(df, "num_rows"):
+            self.bytes += int(df.nbytes)
+        else:
+            self.bytes += int(df.memory_usage(index=False, deep=len(df) <= 100_000).sum())
+
+    def finish(self, result):
+        # Records the outcome of the query: a DataFrame, a list of them for a batch, or the exception raised
+        self.finished = time.perf_counter()
+        if isinstance(result, BaseException):
+            self.status = type(result).__name__
+        for frame in result if isinstance(result, list) else [result]:
+            if hasattr(frame, "memory_usage") or hasattr(frame, "num_rows"):
+                self.add_result(frame)
+        if enabled():
+            record(self.as_dict())
+        return self
+
+    def as_dict(self):
+        phases = dict(self.phases)
+        # A finished timer keeps its total, it may be reported well after the query ended
+        phases["total"] = (self.finished or time.perf_counter()) - self.started + phases.get("connect", 0.0)
+        return {
+            "label": self.label,
+            "query_hash": self.query_hash,
+            "worker": worker_id(),
+            "timestamp": time.time(),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "status": self.status,
+            "phases": {name: round(seconds, 6) for name, seconds in phases.items()},
+        }
+
+def enabled():
+    return os.getenv("QUERY_METRICS", "1").lower() not in ("0", "false", "no")
+
+def worker_id():
+    return os.getenv("PYTEST_XDIST_WORKER", "main")
+
+def metrics_dir():
+    # Each run writes to its own folder, named by the run id the controller sets before workers start.
+    # The folder is only created by the first query recorded, runs without queries leave nothing behind
+    run_id = os.environ.setdefault("QUERY_METRICS_RUN_ID", time.strftime("%Y%m%d_%H%M%S"))
+    return os.path.join(os.getenv("QUERY_METRICS_DIR", configurations.get_relative_path_of_folder("target/metrics")), run_id)
+
+def record(metrics):
+    # One JSON line per query in this worker's file, so workers never write to the same file
+    line = json.dumps(metrics, separators=(",", ":"))
+    path = metrics_dir()
+    with _write_lock:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"query_metrics_{worker_id()}.jsonl"), "a") as file:
+            file.write(line + "\n")
+
+def load_run(path=None):
+    records = []
+    for file_path in glob.glob(os.path.join(path or metrics_dir(), "query_metrics_*.jsonl")):
+        with open(file_path, "r") as file:
+            records.extend(json.loads(line) for line in file if line.strip())
+    return records
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+def summarise(records):
+    summary = {}
+    for phase in PHASES:
+        values = [record["phases"][phase] for record in records if phase in record["phases"]]
+        if values:
+            summary[phase] = {"count": len(values), "sum": round(sum(values), 3), "max": round(max(values), 3)}
+            summary[phase].update({f"p{percent}": round(percentile(values, percent), 3) for percent in PERCENTILES})
+    slowest = sorted(records, key=lambda record: record["phases"].get("total", 0.0), reverse=True)[:10]
+    return {
+        "queries": len(records),
+        "rows": sum(record["rows"] for record in records),
+        "bytes": sum(record["bytes"] for record in records),
+        "phases": summary,
+        "slowest": [{"label": record["label"], "worker": record["worker"], "total": record["phases"].get("total")} for record in slowest],
+    }
+
+def format_summary(summary):
+    header = f"{'phase':<14}{'count':>8}{'sum':>10}" + "".join(f"{f'p{percent}':>9}" for percent in PERCENTILES) + f"{'max':>9}"
+    lines = [f"Queries: {summary['queries']}, rows: {summary['rows']}, bytes: {summary['bytes']}", header]
+    for phase, stats in summary["phases"].items():
+        lines.append(
+            f"{phase:<14}{stats['count']:>8}{stats['sum']:>10.3f}"
+            + "".join(f"{stats[f'p{percent}']:>9.3f}" for percent in PERCENTILES)
+            + f"{stats['max']:>9.3f}"
+        )
+    if summary["slowest"]:
+        lines.append("Slowest queries:")
+        lines.extend(f"  {entry['total']:.3f}s {entry['label']} ({entry['worker']})" for entry in summary["slowest"])
+    return "\n".join(lines)
+
+def write_summary(path=None):
+    # Merges every worker's file of the run into a JSON summary and a percentile table
+    path = path or metrics_dir()
+    records = load_run(path)
+    if not records:
+        return None
+    summary = summarise(records)
+    with open(os.path.join(path, "query_metrics_summary.json"), "w") as file:
+        json.dump(summary, file, indent=4)
+    table = format_summary(summary)
+    with open(os.path.join(path, "query_metrics_summary.txt"), "w") as file:
+        file.write(table + "\n")
+    return table
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+# Database qualified table names following FROM or JOIN in a rendered query
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+\"?([A-Za-z0-9_$#]+)\"?\.\"?([A-Za-z0-9_$#]+)\"?", re.IGNORECASE)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def enabled():
+    return os.getenv("SQL_RESULT_CACHE", "").lower() in ("1", "true", "yes")
+
+class ResultCache:
+    """Query results stored as Parquet files keyed by a hash of the rendered SQL and DB_ENV."""
+
+    # Entries expire ttl seconds after they were written and the least recently read ones are
+    # removed once the directory grows past max_bytes. With check_alter_time the LastAlterTimeStamp
+    # of the tables a query reads is stored with the entry and must still match when it is read back
+    def __init__(self, directory=None, max_bytes=None, ttl=None, check_alter_time=None):
+        self.directory = directory or shared_cache.cache_dir("results")
+        self.max_bytes = max_bytes or int(float(os.getenv("SQL_RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else float(os.getenv("SQL_RESULT_CACHE_TTL", "86400"))
+        if check_alter_time is None:
+            check_alter_time = os.getenv("SQL_RESULT_CACHE_CHECK_ALTER", "").lower() in ("1", "true", "yes")
+        self.check_alter_time = check_alter_time
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, query, env, *options):
+        digest = hashlib.sha256()
+        for part in (query, env) + options:
+            digest.update(str(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def paths(self, key):
+        return os.path.join(self.directory, f"{key}.parquet"), os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, signature=None):
+        data_path, meta_path = self.paths(key)
+        meta = shared_cache.read_json(meta_path)
+        if meta is None or time.time() - meta["created"] > self.ttl or meta.get("signature") != signature:
+            self.misses += 1
+            return None
+        import pandas as pd
+        try:
+            result = pd.read_parquet(data_path)
+            # Reading an entry marks it as recently used for eviction
+            os.utime(data_path)
+        except (OSError, ValueError) as e:
+            logger.info(f"Unreadable result cache entry {key}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, df, signature=None):
+        # A result that cannot be cached never fails the query it came from: columns Arrow cannot
+        # type (mixed objects), a full disk or a file another worker holds open on Windows are logged
+        data_path, meta_path = self.paths(key)
+        temp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(temp_path, index=False)
+            os.replace(temp_path, data_path)
+            shared_cache.atomic_write_json(meta_path, {"created": time.time(), "rows": len(df), "signature": signature})
+        except Exception as e:
+            logger.warning(f"Result not cached: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        try:
+            self.evict()
+        except Exception as e:
+            logger.warning(f"Result cache eviction failed: {e}")
+        return True
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".parquet"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.name[:-len(".parquet")]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Another worker may be evicting the same entry at the same time
+            for path in self.paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def clear(self):
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith((".parquet", ".json")):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+def referenced_tables(query):
+    return sorted({(database.upper(), table.upper()) for database, table in TABLE_PATTERN.findall(query)})
+
+def alter_time_query(tables):
+    conditions = " OR ".join(f"(DatabaseName = '{database}' AND TableName = '{table}')" for database, table in tables)
+    return f"SELECT DatabaseName, TableName, LastAlterTimeStamp FROM DBC.TablesV WHERE {conditions};"
+
+def get_result_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,196 @@
+import os
+import numpy as np
+import pandas as pd
+from src.utilities import columnar, customlogger
+
+logger = customlogger.custom_logger()
+
+# Integers from here on are not exact as float64, so they are compared as text
+EXACT_FLOAT_LIMIT = 2 ** 53
+
+def hash_values(values):
+    # Numeric columns hash by value, so ints and floats of the same value match when compare_dataframes
+    # infers the dtypes of each side. Text hashes exactly, diff_files reads every column as text so
+    # codes like "001" and "1" stay different
+    if pd.api.types.is_bool_dtype(values) or not pd.api.types.is_numeric_dtype(values):
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return hash_numbers(values.astype("float64").to_numpy(), values.astype(str).to_numpy(dtype=object))
+
+def hash_numbers(numbers, text):
+    exact = ~np.isnan(numbers) & (np.abs(numbers) < EXACT_FLOAT_LIMIT)
+    if exact.all():
+        return pd.util.hash_array(numbers)
+    hashes = pd.util.hash_array(text)
+    hashes[exact] = pd.util.hash_array(numbers[exact])
+    return hashes
+
+def hash_rows(df, columns=None):
+    # One 64-bit hash per row, computed column-wise by pandas rather than a Python tuple per row
+    frame = df if columns is None else df[list(columns)]
+    if not len(frame.select_dtypes(include="number").columns):
+        return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    hashes = pd.DataFrame({position: hash_values(frame.iloc[:, position]) for position in range(frame.shape[1])})
+    return pd.util.hash_pandas_object(hashes, index=False).to_numpy()
+
+def rows_in(df1, df2):
+    # Boolean Series over df1's rows, True where the same row also appears in df2
+    return pd.Series(np.isin(hash_rows(df1), hash_rows(df2)), index=df1.index)
+
+def read_chunks(source, chunksize, usecols=None):
+    # Both sides are read as text so a column inferred differently in each file still compares equal.
+    # Parquet and Arrow sources are read batch by batch from the memory-mapped file
+    if isinstance(source, pd.DataFrame):
+        yield source if usecols is None else source[usecols]
+        return
+    if columnar.is_columnar(source):
+        for batch in columnar.iter_batches(source, chunksize, usecols):
+            yield columnar.batch_as_text(batch)
+        return
+    yield from pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize, usecols=usecols)
+
+class RowDiff:
+    """Result of comparing two extracts: summary counts plus the differing rows when requested."""
+
+    def __init__(self, summary, missing_rows=None, extra_rows=None, mismatches=None):
+        self.summary = summary
+        self.missing_rows = missing_rows
+        self.extra_rows = extra_rows
+        self.mismatches = mismatches
+
+    @property
+    def matches(self):
+        return self.summary["missing"] == 0 and self.summary["extra"] == 0 and self.summary.get("changed", 0) == 0
+
+class RowDiffEngine:
+    """Hash-based comparison of a source and target extract in bounded memory."""
+
+    # Each side is streamed in chunks and reduced to 8 bytes per row (16 with key columns), the
+    # comparison runs on those hash arrays, and only rows that differ are read back in a second pass
+    def __init__(self, key_columns=None, chunksize=None, max_reported_rows=None):
+        self.key_columns = list(key_columns) if key_columns else None
+        self.chunksize = chunksize or int(os.getenv("DIFF_CHUNK_SIZE", "500000"))
+        self.max_reported_rows = max_reported_rows or int(os.getenv("DIFF_MAX_REPORTED_ROWS", "10000"))
+
+    def compare(self, source, target, summary_only=False):
+        if self.key_columns:
+            return self._compare_by_key(source, target, summary_only)
+        return self._compare_rows(source, target, summary_only)
+
+    def _hashes(self, source):
+        row_hashes, key_hashes = [], []
+        for chunk in read_chunks(source, self.chunksize):
+            row_hashes.append(hash_rows(chunk))
+            if self.key_columns:
+                key_hashes.append(hash_rows(chunk, self.key_columns))
+        row_hashes = np.concatenate(row_hashes) if row_hashes else np.empty(0, dtype=np.uint64)
+        if not self.key_columns:
+            return row_hashes
+        key_hashes = np.concatenate(key_hashes) if key_hashes else np.empty(0, dtype=np.uint64)
+        return pd.DataFrame({"key": key_hashes, "row": row_hashes})
+
+    def _compare_rows(self, source, target, summary_only):
+        source_hashes, target_hashes = self._hashes(source), self._hashes(target)
+        # Rows are compared as multisets, a duplicated row has to appear as often on both sides
+        source_counts = pd.Series(source_hashes).value_counts()
+        target_counts = pd.Series(target_hashes).value_counts()
+        difference = source_counts.subtract(target_counts, fill_value=0)
+        missing_hashes = difference[difference > 0]
+        extra_hashes = -difference[difference < 0]
+        summary = {
+            "source_rows": len(source_hashes),
+            "target_rows": len(target_hashes),
+            "missing": int(missing_hashes.sum()),
+            "extra": int(extra_hashes.sum()),
+        }
+        summary["matched"] = summary["source_rows"] - summary["missing"]
+        if summary_only:
+            return RowDiff(summary)
+        return RowDiff(
+            summary,
+            missing_rows=self._select_rows(source, hash_rows, set(missing_hashes.index), missing_hashes),
+            extra_rows=self._select_rows(target, hash_rows, set(extra_hashes.index), extra_hashes),
+        )
+
+    def _compare_by_key(self, source, target, summary_only):
+        source_hashes, target_hashes = self._hashes(source), self._hashes(target)
+        duplicated = int(source_hashes["key"].duplicated().sum() + target_hashes["key"].duplicated().sum())
+        if duplicated:
+            logger.warning(f"{duplicated} rows share key values {self.key_columns}, only the first of each is compared")
+        merged = source_hashes.drop_duplicates("key").merge(
+            target_hashes.drop_duplicates("key"), on="key", how="outer", suffixes=("_source", "_target"), indicator=True
+        )
+        missing_keys = merged.loc[merged["_merge"] == "left_only", "key"]
+        extra_keys = merged.loc[merged["_merge"] == "right_only", "key"]
+        both = merged[merged["_merge"] == "both"]
+        changed_keys = both.loc[both["row_source"] != both["row_target"], "key"]
+        summary = {
+            "source_rows": len(source_hashes),
+            "target_rows": len(target_hashes),
+            "missing": len(missing_keys),
+            "extra": len(extra_keys),
+            "changed": len(changed_keys),
+            "matched": len(both) - len(changed_keys),
+        }
+        if summary_only:
+            return RowDiff(summary)
+
+        key_hash = lambda chunk: hash_rows(chunk, self.key_columns)
+        changed = set(changed_keys)
+        source_changed = self._select_rows(source, key_hash, changed)
+        target_changed = self._select_rows(target, key_hash, changed)
+        return RowDiff(
+            summary,
+            missing_rows=self._select_rows(source, key_hash, set(missing_keys)),
+            extra_rows=self._select_rows(target, key_hash, set(extra_keys)),
+            mismatches=self._column_mismatches(source_changed, target_changed),
+        )
+
+    def _select_rows(self, source, hash_func, wanted, counts=None):
+        # Second pass that keeps only the rows whose hash is in wanted, up to max_reported_rows.
+        # With counts (hash -> number of rows), a duplicated row is only reported as often as it is unmatched
+        if not wanted:
+            return pd.DataFrame()
+        wanted = np.fromiter(wanted, dtype=np.uint64)
+        remaining = counts.copy() if counts is not None else None
+        selected, kept = [], 0
+        for chunk in read_chunks(source, self.chunksize):
+            hashes = hash_func(chunk)
+            matched = np.isin(hashes, wanted)
+            rows = chunk[matched]
+            if remaining is not None:
+                row_hashes = pd.Series(hashes[matched])
+                keep = (row_hashes.groupby(row_hashes).cumcount() < row_hashes.map(remaining).fillna(0)).to_numpy()
+                rows = rows[keep]
+                remaining = remaining.subtract(row_hashes[keep].value_counts(), fill_value=0)
+            selected.append(rows.head(self.max_reported_rows - kept))
+            kept += len(selected[-1])
+            if kept >= self.max_reported_rows:
+                logger.info(f"Row report truncated at {self.max_reported_rows} rows")
+                break
+        return pd.concat(selected, ignore_index=True)
+
+    def _column_mismatches(self, source_rows, target_rows):
+        # One row per key and column whose values differ between source and target
+        if source_rows.empty:
+            return pd.DataFrame(columns=self.key_columns + ["Column", "Source Value", "Target Value"])
+        aligned = source_rows.drop_duplicates(self.key_columns).merge(
+            target_rows.drop_duplicates(self.key_columns), on=self.key_columns, suffixes=("_source", "_target")
+        )
+        mismatches = []
+        for column in [column for column in source_rows.columns if column not in self.key_columns]:
+            if f"{column}_target" not in aligned:
+                continue
+            source_values, target_values = aligned[f"{column}_source"], aligned[f"{column}_target"]
+            differs = (source_values != target_values) & ~(source_values.isna() & target_values.isna())
+            if differs.any():
+                rows = aligned.loc[differs, self.key_columns].copy()
+                rows["Column"] = column
+                rows["Source Value"] = source_values[differs].to_numpy()
+                rows["Target Value"] = target_values[differs].to_numpy()
+                mismatches.append(rows)
+        if not mismatches:
+            return pd.DataFrame(columns=self.key_columns + ["Column", "Source Value", "Target Value"])
+        return pd.concat(mismatches, ignore_index=True)
+
+def diff_files(source, target, key_columns=None, summary_only=False, chunksize=None):
+    return RowDiffEngine(key_columns=key_columns, chunksize=chunksize).compare(source, target, summary_only=summary_only)
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+import pytest
+
+# Project modules are imported where used, as this module also runs as a script on the merge agent.
+# Each of K agents runs `pytest --shard i/K ...` on the same selection, then one agent runs
+# `python src/utilities/shard_runner.py --output <allure-results> <shard allure-results>...`
+logger = logging.getLogger(__name__)
+
+# Files the merge regenerates rather than copies from the shards
+REGENERATED_FILES = {".processed-results.json", "summary.json", "progress.json", "categories.json"}
+STATUSES = ("passed", "failed", "broken", "skipped", "unknown")
+
+def parse_shard(value):
+    # "2/4" is the second of four shards
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard expects i/K, e.g. 1/4, got {value}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"--shard {value} is out of range, i must be between 1 and K")
+    return index, count
+
+def fingerprint(nodeids):
+    # Identifies the collected selection, so shards collected from different trees can be detected
+    return hashlib.sha1("\n".join(sorted(nodeids)).encode()).hexdigest()
+
+def assign_shards(nodeids, count, durations=None):
+    # Shard number (0 based) for every node id, independent of the order the items were collected in.
+    # By count, the sorted ids are cut into K contiguous runs, keeping the rows of an outline together.
+    # By duration, the longest scenarios are handed one by one to the least loaded shard
+    ordered = sorted(nodeids)
+    if durations is None:
+        size, remainder = divmod(len(ordered), count)
+        assignment, start = {}, 0
+        for shard in range(count):
+            end = start + size + (shard < remainder)
+            assignment.update((nodeid, shard) for nodeid in ordered[start:end])
+            start = end
+        return assignment
+
+    loads = [(0.0, shard) for shard in range(count)]
+    assignment = {}
+    for nodeid in sorted(ordered, key=lambda nodeid: -durations.get(nodeid, 0.0)):
+        load, shard = heapq.heappop(loads)
+        assignment[nodeid] = shard
+        heapq.heappush(loads, (load + durations.get(nodeid, 0.0), shard))
+    return assignment
+
+def manifest_name(index, count):
+    return f"shard-{index}-of-{count}.json"
+
+class ShardPlugin:
+    """Keeps only this agent's share of the collected scenarios, selected with --shard i/K."""
+
+    # Every agent, and every xdist worker on it, computes the same split from the same collection,
+    # so nothing has to be coordinated between agents. Splitting by duration needs the same history
+    # file on every agent, pass a shared copy with --shard-durations
+    def __init__(self, config):
+        self.config = config
+        try:
+            self.index, self.count = parse_shard(config.getoption("--shard"))
+        except ValueError as error:
+            raise pytest.UsageError(str(error))
+        self.by = config.getoption("--shard-by")
+        self.durations_path = config.getoption("--shard-durations")
+        self.is_worker = hasattr(config, "workerinput")
+
+    # Runs before the duration scheduler orders what is left, so its prediction covers this shard only
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        nodeids = [item.nodeid for item in items]
+        durations = self.predicted_durations(items) if self.by == "duration" else None
+        assignment = assign_shards(nodeids, self.count, durations)
+        selected = [item for item in items if assignment[item.nodeid] == self.index - 1]
+        deselected = [item for item in items if assignment[item.nodeid] != self.index - 1]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+        if not self.is_worker or config.workerinput.get("workerid") == "gw0":
+            self.write_manifest(nodeids, selected)
+
+    def predicted_durations(self, items):
+        from src.utilities import duration_scheduler
+        if self.durations_path is None:
+            logger.warning("Splitting by duration without --shard-durations, agents must share the same history")
+        history = duration_scheduler.DurationHistory(self.durations_path)
+        return {
+            item.nodeid: history.predict(item.nodeid, duration_scheduler.item_example(item).get('sql_query'))[0]
+            for item in items
+        }
+
+    def write_manifest(self, nodeids, selected):
+        # Recorded next to the results so the merge can check every shard ran on the same selection
+        results_dir = getattr(self.config.option, "allure_report_dir", None)
+        if not results_dir:
+            return
+        os.makedirs(results_dir, exist_ok=True)
+        manifest = {
+            "shard": self.index,
+            "shards": self.count,
+            "by": self.by,
+            "fingerprint": fingerprint(nodeids),
+            "total": len(nodeids),
+            "selected": [item.nodeid for item in selected],
+        }
+        with open(os.path.join(results_dir, manifest_name(self.index, self.count)), "w") as file:
+            json.dump(manifest, file)
+
+def check_manifests(manifests):
+    # Problems that mean scenarios were run twice or not at all
+    if not manifests:
+        return ["No shard manifests found, the inputs were not run with --shard"]
+    problems = []
+    counts = {manifest["shards"] for manifest in manifests}
+    fingerprints = {manifest["fingerprint"] for manifest in manifests}
+    if len(counts) > 1:
+        problems.append(f"Shards were run with different shard counts: {sorted(counts)}")
+    if len(fingerprints) > 1:
+        problems.append("Shards collected different scenarios, check all agents ran the same branch and selection")
+    shards = sorted(manifest["shard"] for manifest in manifests)
+    expected = list(range(1, max(counts) + 1))
+    if shards != expected:
+        problems.append(f"Expected shards {expected}, merged {shards}")
+    return problems
+
+def merge_results(output_dir, input_dirs):
+    # Allure names result, container and attachment files by uuid, so shard files are copied side by side
+    os.makedirs(output_dir, exist_ok=True)
+    manifests, copied = [], 0
+    for input_dir in input_dirs:
+        with os.scandir(input_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name in REGENERATED_FILES:
+                    continue
+                if entry.name.startswith("shard-") and entry.name.endswith(".json"):
+                    with open(entry.path, "r") as file:
+                        manifests.append(json.load(file))
+                    continue
+                target = os.path.join(output_dir, entry.name)
+                if entry.name == "environment.properties" and os.path.exists(target):
+                    continue
+                if os.path.abspath(entry.path) != os.path.abspath(target):
+                    shutil.copy2(entry.path, target)
+                    copied += 1
+    logger.info(f"Copied {copied} files from {len(input_dirs)} shards into {output_dir}")
+    return manifests
+
+def merge_summaries(input_dirs):
+    # Adds up the summary.json the test result plugin wrote for each shard
+    status_counts = {status: 0 for status in STATUSES}
+    for input_dir in input_dirs:
+        summary_path = os.path.join(input_dir, "summary.json")
+        if not os.path.exists(summary_path):
+            logger.warning(f"No summary.json in {input_dir}")
+            continue
+        with open(summary_path, "r") as file:
+            for status, count in json.load(file).items():
+                status_counts[status if status in status_counts else "unknown"] += count
+    return status_counts
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from src.utilities import modify_allure_results
+
+    parser = argparse.ArgumentParser(
+        description="Merge the allure-results of pytest --shard runs and print the combined status summary."
+    )
+    parser.add_argument("inputs", nargs="+", help="allure-results directories of the shards")
+    parser.add_argument("--output", required=True, help="Merged allure-results directory")
+    parser.add_argument(
+        "--summaries-only", action="store_true", help="Only add up the shards' summary.json, without copying results"
+    )
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 when shards are missing or inconsistent")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of processes used to process result files."
+    )
+    args = parser.parse_args()
+
+    if args.summaries_only:
+        summary = merge_summaries(args.inputs)
+        os.makedirs(args.output, exist_ok=True)
+        modify_allure_results.atomic_write_json(os.path.join(args.output, "summary.json"), summary)
+        print(json.dumps(summary))
+        sys.exit(0)
+
+    problems = check_manifests(merge_results(args.output, args.inputs))
+    for problem in problems:
+        logger.warning(problem)
+    if problems and args.strict:
+        sys.exit(1)
+    # Prints the same status JSON the pipeline reads for an unsharded run
+    modify_allure_results.process_and_summarize_results(args.output, args.workers)
+    modify_allure_results.create_allure_categories(args.output)
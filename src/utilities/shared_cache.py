@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from src.configs import configurations
+
+# Files shared between xdist workers (and between runs) live under one cache directory
+def cache_dir(*parts):
+    path = os.path.join(os.getenv("TEST_CACHE_DIR", configurations.get_relative_path_of_folder("target/.cache")), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def is_fresh(path, ttl):
+    try:
+        return ttl is None or time.time() - os.path.getmtime(path) < ttl
+    except OSError:
+        return False
+
+def read_json(path, default=None):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data, separators=(",", ":")))
+
+def atomic_write_text(path, text):
+    # Write to a temporary file and rename it so readers never see a partially written file.
+    # The thread is part of the name, as query threads of one worker may write the same file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w") as file:
+            file.write(text)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class FileLock:
+    """Cross-process lock based on exclusive creation of a lock file."""
+
+    # O_EXCL creation works the same on Windows agents and Linux, unlike fcntl/msvcrt locking.
+    # A lock file older than stale_after is assumed to belong to a crashed worker and removed.
+    # With heartbeat, the holder touches the lock file every heartbeat seconds, so a lock held for
+    # longer than stale_after is only taken over once its holder has died. timeout=None waits forever
+    def __init__(self, path, timeout=300, stale_after=900, poll_interval=0.1, heartbeat=None):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._fd = None
+        self._stop_heartbeat = None
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self._fd, str(os.getpid()).encode())
+                if self.heartbeat:
+                    self._start_heartbeat()
+                return self
+            except FileExistsError:
+                if not is_fresh(self.path, self.stale_after):
+                    try:
+                        os.remove(self.path)
+                    except OSError:
+                        pass
+                    continue
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(self.poll_interval)
+
+    def _start_heartbeat(self):
+        stop, path, interval = threading.Event(), self.path, self.heartbeat
+        self._stop_heartbeat = stop
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    os.utime(path)
+                except OSError:
+                    return
+
+        threading.Thread(target=beat, daemon=True).start()
+
+    def release(self):
+        if self._stop_heartbeat is not None:
+            self._stop_heartbeat.set()
+            self._stop_heartbeat = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
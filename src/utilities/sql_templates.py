@@ -0,0 +1,137 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from src.utilities import customlogger, file_index
+
+logger = customlogger.custom_logger()
+
+# {$ENV} is replaced with DB_ENV, %NAME with the Examples column of that name (case insensitive)
+PLACEHOLDER_PATTERN = re.compile(r"\{\$ENV\}|%([A-Za-z_][A-Za-z0-9_]*)")
+ENV_PLACEHOLDER = "{$ENV}"
+# String literals and comments, where a % is usually a LIKE wildcard or prose rather than a placeholder
+QUOTED_PATTERN = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# One registry per SQL search path, shared by the step module and the collection hooks
+_registries = {}
+_registries_lock = threading.Lock()
+
+class SqlTemplate:
+    """A SQL file parsed once into literal text and named placeholders."""
+
+    def __init__(self, name, path, text):
+        self.name = name
+        self.path = path
+        self.segments = []
+        # Placeholders inside literals or comments are still substituted when an Examples column
+        # matches, as before, but one that matches no column is left alone and not reported
+        self.quoted = []
+        quoted_spans = [match.span() for match in QUOTED_PATTERN.finditer(text)]
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.segments.append(text[position:match.start()])
+            self.segments.append(ENV_PLACEHOLDER if match.group(1) is None else match.group(1))
+            self.quoted.append(any(start <= match.start() < end for start, end in quoted_spans))
+            position = match.end()
+        self.segments.append(text[position:])
+        # Even positions hold literal text, odd positions hold placeholder names
+        self.placeholders = {segment.casefold() for segment in self.segments[1::2] if segment != ENV_PLACEHOLDER}
+        self._plans = {}
+
+    def render(self, params, env):
+        plan = self.plan(tuple(params))
+        parts = []
+        for segment, (key, suffix) in zip(self.segments[::2], plan):
+            parts.append(segment)
+            if key is ENV_PLACEHOLDER:
+                parts.append(f"{env}")
+            elif key is not None:
+                parts.append(params[key] + suffix)
+            else:
+                parts.append(suffix)
+        parts.append(self.segments[-1])
+        return "".join(parts)
+
+    def plan(self, keys):
+        # Resolving placeholders to parameter names only depends on the Examples headers, so it is
+        # done once per header set. A placeholder takes the longest header it starts with, any
+        # trailing text is kept, matching the original per-key %KEY substitution
+        plan = self._plans.get(keys)
+        if plan is None:
+            folded = sorted(((key.casefold(), key) for key in keys), key=lambda pair: len(pair[0]), reverse=True)
+            plan = []
+            for placeholder in self.segments[1::2]:
+                if placeholder == ENV_PLACEHOLDER:
+                    plan.append((ENV_PLACEHOLDER, ""))
+                    continue
+                name = placeholder.casefold()
+                match = next((key for folded_key, key in folded if name.startswith(folded_key)), None)
+                if match is None:
+                    plan.append((None, f"%{placeholder}"))
+                else:
+                    plan.append((match, placeholder[len(match):]))
+            self._plans[keys] = plan
+        return plan
+
+    def unresolved_placeholders(self, keys):
+        return [
+            f"%{placeholder}"
+            for placeholder, quoted, (key, _) in zip(self.segments[1::2], self.quoted, self.plan(tuple(keys)))
+            if key is None and not quoted
+        ]
+
+class SqlTemplateRegistry:
+    """Index of the SQL files under a search path, each parsed on first use and rendered from cache."""
+
+    def __init__(self, search_path, render_cache_size=None):
+        self.search_path = search_path
+        self.index = file_index.get_index(search_path)
+        self.templates = {}
+        self._lock = threading.Lock()
+        self._render_cached = lru_cache(maxsize=render_cache_size or int(os.getenv("SQL_RENDER_CACHE_SIZE", "4096")))(self._render)
+
+    def __contains__(self, name):
+        return self.index.find(name) is not None
+
+    def path(self, name):
+        return self.index.find(name)
+
+    def get(self, name):
+        template = self.templates.get(name)
+        if template is None:
+            path = self.index.find(name)
+            if path is None:
+                raise FileNotFoundError(f"SQL file {name} not found under {self.search_path}")
+            with open(os.path.abspath(path)) as sql_file:
+                template = SqlTemplate(name, path, sql_file.read())
+            with self._lock:
+                self.templates[name] = template
+        return template
+
+    def render(self, name, params, env):
+        return self._render_cached(name, tuple(params.items()), env)
+
+    def validate(self, name, params):
+        # Returns the problems that would otherwise only show up when the scenario runs
+        if name not in self:
+            return [f"SQL file {name} not found under {self.search_path}"]
+        unresolved = self.get(name).unresolved_placeholders(params)
+        if unresolved:
+            return [f"{name} has placeholders with no Examples column: {', '.join(unresolved)}"]
+        return []
+
+    def _render(self, name, params, env):
+        return self.get(name).render(dict(params), env)
+
+def get_registry(search_path):
+    key = os.path.normpath(search_path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = SqlTemplateRegistry(search_path)
+            _registries[key] = registry
+        return registry
+
+def registries():
+    with _registries_lock:
+        return list(_registries.values())
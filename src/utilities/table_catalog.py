@@ -0,0 +1,89 @@
+import os
+import re
+from src.utilities import customlogger, shared_cache
+
+logger = customlogger.custom_logger()
+
+# One catalog per database name pattern per worker process
+_catalogs = {}
+
+class TableCatalog:
+    """Table names of a DB_ENV, read from DBC.TablesV once per run and shared between workers."""
+
+    # The first worker to need the catalog runs a single query for the whole environment and
+    # writes it to the shared cache, the others wait on the lock and read the file instead
+    def __init__(self, db_helper, database_name, ttl=None):
+        self.db_helper = db_helper
+        self.database_name = database_name
+        self.ttl = ttl if ttl is not None else float(os.getenv("TABLE_CACHE_TTL", "3600"))
+        safe_name = re.sub(r"[^A-Za-z0-9_]", "_", database_name or "")
+        self.cache_file = os.path.join(shared_cache.cache_dir("tables"), f"{safe_name}.json")
+        self.tables = None
+
+    def exists(self, table_name):
+        if self.tables is None:
+            self.tables = self.load()
+        if normalise(table_name) in self.tables:
+            return True
+        # A miss may be a table created after the catalog was cached, so confirm it directly
+        if self.query_table_exists(table_name):
+            self.tables.add(normalise(table_name))
+            return True
+        return False
+
+    def load(self):
+        tables = self.read_cache()
+        if tables is not None:
+            return tables
+
+        with shared_cache.FileLock(f"{self.cache_file}.lock"):
+            # Another worker may have written the catalog while we waited for the lock
+            tables = self.read_cache()
+            if tables is not None:
+                return tables
+            tables = self.query_tables()
+            shared_cache.atomic_write_json(self.cache_file, sorted(tables))
+            logger.info(f"Cached {len(tables)} table names for {self.database_name} in {self.cache_file}")
+            return tables
+
+    def read_cache(self):
+        if not shared_cache.is_fresh(self.cache_file, self.ttl):
+            return None
+        tables = shared_cache.read_json(self.cache_file)
+        return set(tables) if tables is not None else None
+
+    def query_tables(self):
+        with self.db_helper.borrowed_session() as helper:
+            result = helper.execute_query(
+                f"SELECT TableName FROM DBC.TablesV WHERE DatabaseName LIKE '{self.database_name}%';",
+                use_cache=False,
+            )
+        if isinstance(result, Exception) or result is None:
+            raise RuntimeError(f"Unable to read table list for {self.database_name}: {result}")
+        return {normalise(name) for name in result["TableName"]}
+
+    def query_table_exists(self, table_name):
+        with self.db_helper.borrowed_session() as helper:
+            table = helper.execute_query(
+                f"SELECT CASE WHEN COUNT(*) > 0 THEN 'TRUE' ELSE 'FALSE' END AS TableExists FROM DBC.TablesV WHERE TableName = '{table_name}' AND DatabaseName like '{self.database_name}%';",
+                use_cache=False,
+            )
+        return not isinstance(table, Exception) and table is not None and 'FALSE' not in table.loc[0, "TableExists"]
+
+    def invalidate(self):
+        self.tables = None
+        try:
+            os.remove(self.cache_file)
+        except OSError:
+            pass
+
+def normalise(table_name):
+    # Teradata object names are not case specific
+    return str(table_name).strip().casefold()
+
+def get_table_catalog(db_helper, database_name):
+    catalog = _catalogs.get(database_name)
+    if catalog is None:
+        catalog = TableCatalog(db_helper, database_name)
+        _catalogs[database_name] = catalog
+    return catalog
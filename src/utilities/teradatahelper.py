@@ -1,28 +1,66 @@
-import pandas as pd
-from src.utilities import customlogger
-import teradatasql
+from src.utilities import admission_control, customlogger, columnar, connection_pool, query_metrics, result_cache
+import contextlib
 import os
 import pytest
 import threading
-import teradata
+import time
 
 logger = customlogger.custom_logger()
 
+# UNION ALL branches take their column types from the first SELECT, so the split key every branch
+# is tagged with has one fixed type and keys that do not fit are refused rather than truncated
+UNION_KEY_COLUMN = "Batch_Key"
+UNION_KEY_LENGTH = 128
+
+# UdaExec initialises logging and run-number files, so only build it once per worker
+_uda_exec = None
+
+def get_uda_exec():
+    global _uda_exec
+    if _uda_exec is None:
+        # The ODBC driver stack is only loaded on the Jenkins agents that use it
+        import teradata
+        _uda_exec = teradata.UdaExec(
+            appName="TDWallet_Connection", version="1.0", logConsole=False
+        )
+    return _uda_exec
+
 class TeradataHelper:
 
-    def __init__(self, host, user, password):
+    def __init__(self, host, user, password, pool_size=None):
         self.host = host
         self.user = user
         self.password = password
         self.connection = None
+        self.connect_seconds = 0.0
+        self.metrics = None
         self.jenkins_run = bool(os.getenv("JENKINS_RUN"))
+        self.pool = connection_pool.get_pool(
+            (host, user, self.jenkins_run), self.open_session, max_size=pool_size
+        )
 
-    def connect(self):
+    def clone(self):
+        # A helper with its own connection slot that shares this helper's session pool
+        return TeradataHelper(self.host, self.user, self.password)
+
+    @contextlib.contextmanager
+    def borrowed_session(self):
+        # Side queries (catalog lookups, batches) run on this helper's session when it holds one and
+        # only take a second pooled session when it does not, as with TD_POOL_SIZE=1 that would wait forever
+        if self.connection is not None:
+            yield self
+            return
+        helper = self.clone()
+        helper.connect()
+        try:
+            yield helper
+        finally:
+            helper.close_connection()
+
+    def open_session(self):
+        # Performs the actual logon, the pool calls this whenever it needs a new session
         if self.jenkins_run:
-            udaExec = teradata.UdaExec(
-                appName="TDWallet_Connection", version="1.0", logConsole=False
-            )
-            self.connection = udaExec.connect(
+            connection = get_uda_exec().connect(
                 method="odbc",
                 system=os.getenv("TERADATA_HOST"),
                 username=os.getenv("TDWALLET_USERNAME"),
@@ -35,43 +73,288 @@ class TeradataHelper:
                 f"Connection to {self.host} established for user {os.getenv('TDWALLET_USERNAME')}"
             )
         else:
+            import teradatasql
             con_str = f"""{{
                 "host": "{self.host}",
                 "user": "{self.user}",
                 "password": "{self.password}",
                 "logmech": "LDAP"
                 }}"""
-            self.connection = teradatasql.connect(con_str)
+            connection = teradatasql.connect(con_str)
             logger.info(f"Connection to {self.host} established for user {self.user}")
+        return connection
+
+    def connect(self):
+        # Check out a warm session from the pool, logging on only when none is idle
+        if self.connection is None:
+            started = time.perf_counter()
+            self.connection = self.pool.acquire()
+            self.connect_seconds = time.perf_counter() - started
+        return self.connection
+
+    def start_timer(self, query, label=None):
+        # The checkout time is charged to the first query run on the session
+        timer = query_metrics.QueryTimer(query, label=label)
+        if self.connect_seconds:
+            timer.add("connect", self.connect_seconds)
+        self.connect_seconds = 0.0
+        self.metrics = timer
+        return timer
 
-    def execute_query(self, query, timeout=1800):
+    def execute_query(self, query, timeout=1800, chunk_size=None, max_rows=None, stop_on=None, label=None, as_arrow=False, use_cache=True):
+        # as_arrow returns a pyarrow Table built column-wise from the fetched rows instead of a DataFrame.
+        # use_cache=False always reaches the database, for metadata lookups that must see the current state
+        import pandas as pd
         if self.connection is None:
             logger.info(f"No active connection to {self.host}")
             return None
 
-        def run_query():
-            with self.connection.cursor() as cur:
-                try:
-                    cur.execute(query)
-                    self.result = pd.DataFrame(
-                        cur.fetchall(), columns=[desc[0] for desc in cur.description]
-                    )
-                    logger.info("Query Executed Successfully")
-                except Exception as ex:
-                    self.result = ex
-                    logger.info(ex)
+        # Any of the streaming options switches from fetchall to bounded fetchmany chunks
+        streaming = chunk_size is not None or max_rows is not None or stop_on is not None
+        timer = self.start_timer(query, label)
+
+        # With SQL_RESULT_CACHE set, an unchanged query against the same DB_ENV is answered from disk
+        cache, cache_key, signature = None, None, None
+        if use_cache and result_cache.enabled() and not as_arrow:
+            cache = result_cache.get_result_cache()
+            # With stop_on the rows returned end at a chunk boundary, so they depend on the chunk size
+            fetch_size = (chunk_size or int(os.getenv("SQL_FETCH_CHUNK_SIZE", "10000"))) if stop_on is not None else None
+            cache_key = cache.key(query, os.getenv("DB_ENV"), max_rows, getattr(stop_on, "__qualname__", stop_on), fetch_size)
+            if cache.check_alter_time:
+                signature = self.table_signature(query)
+                if signature is False:
+                    cache = None
+        if cache is not None:
+            cached = cache.get(cache_key, signature)
+            if cached is not None:
+                logger.info("Query result served from result cache")
+                timer.status = "cached"
+                self.result = cached
+                timer.finish(cached)
+                return cached
+
+        def fetch_result():
+            if not streaming:
+                with self.connection.cursor() as cur:
+                    with timer.phase("execute"):
+                        cur.execute(query)
+                    with timer.phase("fetch"):
+                        rows = cur.fetchall()
+                    with timer.phase("to_dataframe"):
+                        if as_arrow:
+                            return columnar.batches_to_table([columnar.rows_to_batch(rows, [desc[0] for desc in cur.description])])
+                        return pd.DataFrame(rows, columns=[desc[0] for desc in cur.description])
+            chunks = []
+            for chunk in self.stream_query(query, chunk_size=chunk_size, max_rows=max_rows, as_arrow=as_arrow, timer=timer):
+                chunks.append(chunk)
+                if stop_on is not None and stop_on(chunk):
+                    logger.info("Stopped fetching early, stop condition met")
+                    break
+            with timer.phase("to_dataframe"):
+                if as_arrow:
+                    return columnar.batches_to_table(chunks)
+                return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
 
         self.result = None
-        query_thread = threading.Thread(target=run_query)
+        try:
+            with self.admitted(timer) as outcome:
+                self.result = self.run_with_timeout(fetch_result, timeout)
+                outcome["error"] = self.result if isinstance(self.result, BaseException) else None
+        except BaseException as ex:
+            self.result = ex
+            raise
+        finally:
+            timer.finish(self.result)
+        if cache is not None and isinstance(self.result, pd.DataFrame):
+            cache.put(cache_key, self.result, signature)
+        return self.result
+
+    def table_signature(self, query):
+        # LastAlterTimeStamp of each table the query reads, False when it cannot be determined.
+        # Teradata updates it on DDL and on some utility loads, so the TTL still bounds staleness
+        tables = result_cache.referenced_tables(query)
+        if not tables:
+            return None
+        try:
+            with self.connection.cursor() as cur:
+                cur.execute(result_cache.alter_time_query(tables))
+                rows = cur.fetchall()
+        except Exception as e:
+            logger.info(f"Unable to read LastAlterTimeStamp, result cache skipped: {e}")
+            return False
+        return sorted(f"{database.strip()}.{table.strip()}={timestamp}" for database, table, timestamp in rows)
+
+    def execute_batch(self, queries, timeout=1800, max_rows=None, mode="multistatement", key_column=None, keys=None, label=None):
+        import pandas as pd
+        # Runs several SELECTs in one round trip and returns one result per query, in order.
+        # "multistatement" sends them as one multi-statement request and reads each result set,
+        # "union" combines them with UNION ALL and splits the rows back by key_column/keys
+        if self.connection is None:
+            logger.info(f"No active connection to {self.host}")
+            return None
+        statements = [query.strip().rstrip(";").strip() for query in queries]
+
+        def fetch_rows(cur, limit):
+            columns = [desc[0] for desc in cur.description]
+            with timer.phase("fetch"):
+                rows = cur.fetchall() if limit is None else cur.fetchmany(limit)
+            with timer.phase("to_dataframe"):
+                return pd.DataFrame(rows, columns=columns)
+
+        def fetch_multistatement():
+            with self.connection.cursor() as cur:
+                with timer.phase("execute"):
+                    cur.execute(";\n".join(statements) + ";")
+                results = [fetch_rows(cur, max_rows)]
+                while cur.nextset():
+                    results.append(fetch_rows(cur, max_rows))
+            if len(results) != len(statements):
+                raise ValueError(f"Expected {len(statements)} result sets from batch, got {len(results)}")
+            return results
+
+        def fetch_union():
+            split_keys = [str(key).strip() for key in keys]
+            if len(set(split_keys)) != len(split_keys) or any(len(key) > UNION_KEY_LENGTH for key in split_keys):
+                raise ValueError(f"UNION ALL batch keys must be distinct and at most {UNION_KEY_LENGTH} characters")
+            branches = [
+                f"SELECT CAST('{key.replace(chr(39), chr(39) * 2)}' AS VARCHAR({UNION_KEY_LENGTH})) AS {UNION_KEY_COLUMN}, "
+                f"batch_query.* FROM (\n{statement}\n) AS batch_query"
+                for key, statement in zip(split_keys, statements)
+            ]
+            with self.connection.cursor() as cur:
+                with timer.phase("execute"):
+                    cur.execute("\nUNION ALL\n".join(branches))
+                # One row past the shared cap shows whether it cut the result short
+                combined = fetch_rows(cur, None if max_rows is None else max_rows * len(statements) + 1)
+            if max_rows is not None and len(combined) > max_rows * len(statements):
+                # Large results of some statements may have crowded out every row of others
+                raise ValueError(f"UNION ALL batch exceeded {max_rows * len(statements)} rows, results may be incomplete")
+            # A row whose own key differs from the branch it came from was truncated or converted by the
+            # UNION ALL, its values cannot be trusted and an unmatched FAIL row must never read as a pass
+            tags = combined[UNION_KEY_COLUMN].astype(str).str.strip()
+            if (combined[key_column].astype(str).str.strip() != tags).any() or not tags.isin(split_keys).all():
+                raise ValueError(f"UNION ALL batch returned {key_column} values that do not match their statement")
+            combined = combined.drop(columns=UNION_KEY_COLUMN)
+            # Each statement keeps at most max_rows, as it would when run on its own
+            groups = {key: group.head(max_rows).reset_index(drop=True) for key, group in combined.groupby(tags, sort=False)}
+            return [groups.get(key, combined.iloc[0:0]) for key in split_keys]
+
+        if mode == "union" and (key_column is None or keys is None):
+            raise ValueError("UNION ALL batching needs key_column and keys to split the result")
+        fetch_func = fetch_union if mode == "union" else fetch_multistatement
+        timer = self.start_timer("\n".join(statements), label or f"batch of {len(statements)}")
+        results = None
+        try:
+            with self.admitted(timer) as outcome:
+                results = self.run_with_timeout(fetch_func, timeout)
+                outcome["error"] = results if isinstance(results, BaseException) else None
+        except BaseException as ex:
+            results = ex
+            raise
+        finally:
+            timer.finish(results)
+        return results
+
+    @contextlib.contextmanager
+    def admitted(self, timer):
+        # With ADMISSION_CONTROL set, the query first waits for a slot under the limit shared by all workers
+        if not admission_control.enabled():
+            yield {}
+            return
+        with admission_control.get_governor().admit(timer.query_hash) as outcome:
+            if outcome["waited"] > 0.001:
+                timer.add("admission", outcome["waited"])
+            yield outcome
+
+    def run_with_timeout(self, fetch_func, timeout):
+        # Runs fetch_func on a worker thread, cancelling the request if it exceeds the timeout
+        outcome = {}
+        cancelled = threading.Event()
+
+        def run_query(retry_on_drop=True):
+            try:
+                outcome["result"] = fetch_func()
+                logger.info("Query Executed Successfully")
+            except Exception as ex:
+                # A dropped session is replaced and the query retried once on the new session
+                if retry_on_drop and not cancelled.is_set() and not self.pool.is_healthy(self.connection):
+                    logger.info(f"Session dropped, reconnecting: {ex}")
+                    try:
+                        self.connection = self.pool.replace(self.connection)
+                    except Exception as reconnect_ex:
+                        self.connection = None
+                        outcome["result"] = reconnect_ex
+                        logger.info(reconnect_ex)
+                        return
+                    return run_query(retry_on_drop=False)
+                outcome["result"] = ex
+                logger.info(ex)
+
+        # Daemon thread so an abandoned query can never keep the worker process alive
+        query_thread = threading.Thread(target=run_query, daemon=True)
         query_thread.start()
         query_thread.join(timeout)
         if query_thread.is_alive():
-            logger.info("Query timed out")
-            pytest.skip("Query timed out")
-        return self.result
+            cancelled.set()
+            logger.info(f"Query timed out after {timeout}s, cancelling")
+            self.cancel_query(query_thread)
+            pytest.skip(f"Query timed out after {timeout}s")
+        return outcome.get("result")
+
+    def cancel_query(self, query_thread, grace_period=None):
+        # Abort the running request server-side and make sure the session is clean before it is reused
+        grace_period = grace_period if grace_period is not None else float(os.getenv("SQL_CANCEL_GRACE_SECONDS", "30"))
+        connection = self.connection
+        cancel = getattr(connection, "cancel", None)
+        if cancel is not None:
+            try:
+                cancel()
+                logger.info("Cancel request sent for running query")
+            except Exception as e:
+                logger.info(f"Cancel request failed: {e}")
+            query_thread.join(grace_period)
+
+        if query_thread.is_alive() or not self.pool.is_healthy(connection):
+            # The driver could not abort the request, so log the session off to kill it
+            logger.info("Discarding session of cancelled query")
+            self.pool.release(connection, discard=True)
+            self.connection = None
+            query_thread.join(grace_period)
+            if query_thread.is_alive():
+                logger.info("Query thread still blocked in the driver after session logoff")
+        else:
+            logger.info("Query cancelled, session returned to a clean state")
+
+    def stream_query(self, query, chunk_size=None, max_rows=None, as_arrow=False, timer=None):
+        # Yields the result in fetchmany chunks (DataFrames or Arrow record batches), stopping at max_rows
+        import pandas as pd
+        chunk_size = chunk_size or int(os.getenv("SQL_FETCH_CHUNK_SIZE", "10000"))
+        timer = timer or query_metrics.QueryTimer()
+        with self.connection.cursor() as cur:
+            with timer.phase("execute"):
+                cur.execute(query)
+            columns = [desc[0] for desc in cur.description]
+            fetched, chunks_yielded = 0, 0
+            while max_rows is None or fetched < max_rows:
+                size = chunk_size if max_rows is None else min(chunk_size, max_rows - fetched)
+                with timer.phase("fetch"):
+                    rows = cur.fetchmany(size)
+                # An empty result still yields one empty chunk so callers get the column names
+                if not rows and chunks_yielded:
+                    break
+                fetched += len(rows)
+                chunks_yielded += 1
+                with timer.phase("to_dataframe"):
+                    chunk = columnar.rows_to_batch(rows, columns) if as_arrow else pd.DataFrame(rows, columns=columns)
+                yield chunk
+                if not rows:
+                    break
+            if max_rows is not None and fetched >= max_rows:
+                logger.info(f"Result capped at {max_rows} rows")
 
     def close_connection(self):
+        # Return the session to the pool, it is only logged off when the pool is shut down
         if self.connection is not None:
-            self.connection.close()
+            self.pool.release(self.connection)
             self.connection = None
-            logger.info("Connection closed")
+            logger.info("Connection released to pool")
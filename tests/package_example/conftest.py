@@ -1,8 +1,10 @@
 import pytest
 import os
+import json
+import platform
+import time
 from dotenv import load_dotenv
-from src.utilities import customlogger
-import allure
+from src.utilities import admission_control, customlogger, connection_pool, duration_scheduler, feature_cache, helpers, query_engine, query_metrics, shard_runner, shared_cache, sql_templates, modify_allure_results
 
 # Load environment variables from a .env file
 load_dotenv(os.path.abspath(".env"))
@@ -18,6 +20,37 @@ def pytest_addoption(parser):
         default="development",
         help="Environment for database execution (e.g. R1, V3)"
     )
+    parser.addoption(
+        "--schedule-by-duration",
+        action="store_true",
+        default=False,
+        help="Run scenarios longest-first using the runtimes recorded in earlier runs"
+    )
+    parser.addoption(
+        "--group-by-table",
+        action="store_true",
+        default=False,
+        help="Mark scenarios with their target table as xdist group (use with --dist loadgroup)"
+    )
+    parser.addoption(
+        "--shard",
+        action="store",
+        default=None,
+        help="Run only shard i of K of the collected scenarios (e.g. 2/4), one shard per agent"
+    )
+    parser.addoption(
+        "--shard-by",
+        action="store",
+        choices=("count", "duration"),
+        default="count",
+        help="Balance shards by scenario count or by the runtimes recorded in earlier runs"
+    )
+    parser.addoption(
+        "--shard-durations",
+        action="store",
+        default=None,
+        help="Duration history file shared by all agents, used with --shard-by duration"
+    )
 
 # Fixture to set the DB_ENV environment variable before the session starts
 @pytest.fixture(scope='session', autouse=True)
@@ -30,55 +63,214 @@ def set_db_env(request):
     os.environ['DB_ENV'] = db_env
     logger.info(f"Setting DB_ENV to {db_env}")
 
-# Test result plugin to detect broken tests and manage retries
+# Credentials are decrypted once per worker session and shared by every scenario
+@pytest.fixture(scope='session')
+def teradata_credentials():
+    from src.utilities import credentials_cryptographer as cc
+    return cc.decrypt_credential(os.getenv('TERADATA_USERNAME')), cc.decrypt_credential(os.getenv('TERADATA_PASSWORD'))
+
+# Session-wide Teradata helper, the driver is only imported when the first session logs on
+@pytest.fixture(scope='session')
+def db_helper(teradata_credentials):
+    from src.utilities.teradatahelper import TeradataHelper
+    user, password = teradata_credentials
+    return TeradataHelper(host=os.getenv('TERADATA_HOST'), user=user, password=password)
+
+# Fixture to log off every pooled Teradata session once the worker's session ends
+@pytest.fixture(scope='session', autouse=True)
+def teradata_connection_pool():
+    yield
+    query_engine.shutdown_all()
+    logger.info(f"Teradata connection pool stats: {connection_pool.pool_stats()}")
+    connection_pool.close_all_pools()
+
+# Check every scenario's SQL file and placeholders once at collection time instead of when the scenario runs
+def pytest_collection_modifyitems(session, config, items):
+    registries = sql_templates.registries()
+    if not registries:
+        return
+
+    problems = {}
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is None or '_pytest_bdd_example' not in callspec.params:
+            continue
+        params = helpers.get_example_params(item)
+        sql_query = params.get('sql_query')
+        if not sql_query:
+            continue
+        registry = next((registry for registry in registries if sql_query in registry), registries[0])
+        for problem in registry.validate(sql_query, params):
+            problems.setdefault(problem, item.nodeid)
+
+    for problem, nodeid in problems.items():
+        logger.warning(f"{problem} (first seen in {nodeid})")
+    if problems and os.getenv("SQL_STRICT_PLACEHOLDERS", "").lower() in ("1", "true", "yes"):
+        raise pytest.UsageError("SQL template problems found during collection:\n" + "\n".join(problems))
+
+# Test result plugin that classifies results as they are reported and summarises them when the session ends.
+# Under xdist every worker's reports are forwarded to the controller, so only the controller aggregates
 class TestResultPlugin:
-    def __init__(self):
+    STATUSES = ("passed", "failed", "broken", "skipped", "unknown")
+
+    def __init__(self, config):
+        self.config = config
         self.results = {}
- 
-# Fixture to register the test result plugin
-@pytest.fixture(scope='session', autouse=True)
+        self.is_worker = hasattr(config, "workerinput")
+        self.results_dir = getattr(config.option, "allure_report_dir", None)
+        self.progress_interval = float(os.getenv("PROGRESS_INTERVAL_SECONDS", "5"))
+        self._progress_written_at = 0.0
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker:
+            return
+        status = self.classify(report)
+        if status is None:
+            return
+        # The final status of a test is its call result, unless setup failed or teardown broke a pass
+        if report.when == "teardown" and self.results.get(report.nodeid) != "passed":
+            return
+        self.results[report.nodeid] = status
+        self.write_progress()
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        if self.is_worker:
+            return
+        status_counts = self.status_counts()
+        logger.info(f"Test Summary: {json.dumps(status_counts)}")
+        if self.results_dir:
+            os.makedirs(self.results_dir, exist_ok=True)
+            modify_allure_results.atomic_write_json(os.path.join(self.results_dir, "summary.json"), status_counts)
+            modify_allure_results.create_allure_categories(self.results_dir)
+            self.write_progress(force=True)
+
+    def classify(self, report):
+        # Uses the same rules as modify_allure_results, so live counts match the post-processed files
+        if report.when == "call" or (report.when == "setup" and not report.passed) or (report.when == "teardown" and report.failed):
+            data = {"status": report.outcome, "statusDetails": {"message": report.longreprtext or ""}}
+            modified, status = modify_allure_results.modify_and_update_result(data)
+            if not status:
+                status = modify_allure_results.infer_status_from_steps(data)
+            return status if status in self.STATUSES else "unknown"
+        return None
+
+    def status_counts(self):
+        status_counts = {status: 0 for status in self.STATUSES}
+        for status in self.results.values():
+            status_counts[status] += 1
+        return status_counts
+
+    def write_progress(self, force=False):
+        # Live progress feed for long runs, rewritten at most every PROGRESS_INTERVAL_SECONDS
+        if not self.results_dir or (not force and time.monotonic() - self._progress_written_at < self.progress_interval):
+            return
+        self._progress_written_at = time.monotonic()
+        os.makedirs(self.results_dir, exist_ok=True)
+        progress = dict(self.status_counts(), completed=len(self.results), updated=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        modify_allure_results.atomic_write_json(os.path.join(self.results_dir, "progress.json"), progress)
+
+# Register the test result, duration scheduler and shard plugins on the controller and on every worker
+def pytest_configure(config):
+    # The pack's features are parsed on the controller before the workers start, workers load the cached copies
+    feature_cache.preload(os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature"))
+    if not hasattr(config, "workerinput"):
+        if query_metrics.enabled():
+            # Fixes the query metrics run id before xdist starts the workers, so they inherit it
+            query_metrics.metrics_dir()
+        if admission_control.enabled():
+            # Slots an interrupted earlier run held past the query timeout are freed, the limit it settled on is kept
+            admission_control.Governor(admission_control.state_path(config.getoption("--db-env"))).reset()
+    if not config.pluginmanager.has_plugin('test-result-plugin'):
+        config.pluginmanager.register(TestResultPlugin(config), 'test-result-plugin')
+    if not config.pluginmanager.has_plugin('duration-scheduler'):
+        config.pluginmanager.register(duration_scheduler.DurationSchedulerPlugin(config), 'duration-scheduler')
+    if config.getoption("--shard") and not config.pluginmanager.has_plugin('shard-runner'):
+        config.pluginmanager.register(shard_runner.ShardPlugin(config), 'shard-runner')
+
+# Settled admission limit and the percentile summary of the query metrics of every worker, on the controller
+def pytest_terminal_summary(terminalreporter, config):
+    if hasattr(config, "workerinput"):
+        return
+    if admission_control.enabled():
+        state = admission_control.Governor(admission_control.state_path(config.getoption("--db-env"))).state()
+        terminalreporter.write_line(f"Admission control: concurrent query limit settled at {state['limit']:.1f}")
+    if not query_metrics.enabled():
+        return
+    table = query_metrics.write_summary()
+    if table:
+        terminalreporter.write_sep("-", "query metrics")
+        terminalreporter.write_line(table)
+        logger.info(f"Query metrics written to {query_metrics.metrics_dir()}")
+
+# Worker log files are written out before the worker reports back, and merged on the controller with MERGE_WORKER_LOGS
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session, exitstatus):
+    if hasattr(session.config, "workerinput"):
+        customlogger.flush()
+    elif os.getenv("MERGE_WORKER_LOGS", "").lower() in ("1", "true", "yes"):
+        merged = customlogger.merge_worker_logs()
+        if merged:
+            logger.info(f"Worker logs merged into {merged}")
+
+# Fixture to access the test result plugin
+@pytest.fixture(scope='session')
 def test_result_plugin(pytestconfig):
-    plugin = TestResultPlugin()
-    pytestconfig.pluginmanager.register(plugin, 'test-result-plugin')
-    return plugin
+    return pytestconfig.pluginmanager.get_plugin('test-result-plugin')
+
+# Report folders and environment.properties are prepared once per run, by the xdist controller
+# (or the only process without xdist), before any worker starts. Workers only check the marker
+TEST_PACK = "package_example"
+REPORT_MARKER = ".report-prepared.json"
+_report_prepared = False
 
-# Pytest-BDD hook to write environment details before each scenario
+def pytest_sessionstart(session):
+    global _report_prepared
+    if not hasattr(session.config, "workerinput"):
+        prepare_report_dirs(TEST_PACK, session.config.getoption("--db-env"))
+        _report_prepared = True
+
+# Pytest-BDD hook, a worker confirms the report folders exist on its first scenario only
 def pytest_bdd_before_scenario(request, feature, scenario):
-    test_pack = "package_example"
+    global _report_prepared
+    if _report_prepared:
+        return
+    db_env = os.environ.get('DB_ENV')
+    target_base = os.path.join("target", TEST_PACK)
+    marker = shared_cache.read_json(os.path.join(target_base, REPORT_MARKER))
+    if not marker or marker.get("test_environment") != db_env:
+        os.makedirs(target_base, exist_ok=True)
+        with shared_cache.FileLock(os.path.join(target_base, f"{REPORT_MARKER}.lock")):
+            prepare_report_dirs(TEST_PACK, db_env)
+    _report_prepared = True
 
+def prepare_report_dirs(test_pack, db_env):
     source_base = os.path.join("tests", test_pack)
     target_base = os.path.join("target", test_pack)
+    properties = environment_properties(db_env)
 
-    create_allure_results_and_env_file(target_base)
-
+    create_allure_results_and_env_file(target_base, properties)
     for sub_pack in os.listdir(source_base):
-        sub_pack_path = os.path.join(source_base, sub_pack)
-
-        if os.path.isdir(sub_pack_path):
-            target_sub_pack_path = os.path.join(target_base, sub_pack)
-            create_allure_results_and_env_file(target_sub_pack_path)
-        
-
-def create_allure_results_and_env_file(target_path):
-    allure_results_path = os.path.join(target_path, "allure-results")
+        if os.path.isdir(os.path.join(source_base, sub_pack)) and not sub_pack.startswith(("__", ".")):
+            create_allure_results_and_env_file(os.path.join(target_base, sub_pack), properties)
 
-    if not os.path.exists(allure_results_path):
-        os.makedirs(allure_results_path)
+    shared_cache.atomic_write_json(os.path.join(target_base, REPORT_MARKER), {"test_environment": db_env, "prepared": time.time()})
 
-        create_env_properties_file(target_path)
-    else:
-        create_env_properties_file(target_path)
-        pass
+def create_allure_results_and_env_file(target_path, properties):
+    os.makedirs(os.path.join(target_path, "allure-results"), exist_ok=True)
+    create_env_properties_file(target_path, properties)
 
-def create_env_properties_file(pack_path):
-    os_platform = "os_platform = Microsoft Windows Server 2019 Standard"
-    os_version = "os_version = 10"
-    test_environment = f"test_environment = {os.environ.get('DB_ENV')}"
-    build_version = "build_version = 17763"
-    python_version = "python_version = Python 3.10.7"
+def environment_properties(db_env):
+    # Details of the agent actually running the tests, shown on the Allure report's Environment widget
+    return {
+        "os_platform": platform.platform(terse=True),
+        "os_version": platform.release(),
+        "build_version": platform.version(),
+        "machine": platform.machine(),
+        "test_environment": db_env,
+        "python_version": f"Python {platform.python_version()}",
+        "python_implementation": platform.python_implementation(),
+    }
 
+def create_env_properties_file(pack_path, properties):
     env_file_path = os.path.join(pack_path, "environment.properties")
-    with open(env_file_path, "w") as f:
-        f.write(
-            f"{os_platform}\n{os_version}\n{test_environment}\n{build_version}\n{python_version}"
-        )
+    shared_cache.atomic_write_text(env_file_path, "\n".join(f"{key} = {value}" for key, value in properties.items()))
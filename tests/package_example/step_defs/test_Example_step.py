@@ -1,60 +1,125 @@
 # This file has been produced in the feature file conversion script for the process ACNT_SEG_RDIM
-from src.utilities import helpers, customlogger, credentials_cryptographer as cc
+from src.utilities import helpers, customlogger, query_engine, sql_templates, table_catalog
 from pytest_bdd import scenarios, parsers, given, when, then
-from src.utilities.teradatahelper import TeradataHelper
 from dotenv import load_dotenv
-import pytest, os, re, allure
-import pandas as pd
+import pytest, os, time, json
 
-scenarios('../features/test.feature')
+# The Teradata helper (db_helper), the drivers, pandas and allure are only loaded once a scenario runs,
+# so collecting the pack stays fast
+scenarios('../feature/test.feature')
 load_dotenv()
-dbHelper = TeradataHelper(host=os.getenv('TERADATA_HOST'), user=cc.decrypt_credential(os.getenv('TERADATA_USERNAME')), password=cc.decrypt_credential(os.getenv('TERADATA_PASSWORD')))
 logger = customlogger.custom_logger()
 
+# SQL files are indexed and parsed once, placeholders are checked against the Examples at collection time
+sql_registry = sql_templates.get_registry('tests/package_example/sql')
+
+# Validation results are fetched in chunks and capped, so a runaway query cannot exhaust agent memory
+result_row_cap = int(os.getenv("SQL_RESULT_ROW_CAP", "1000"))
+
+# Query timeout in seconds, overridable per scenario with a "timeout" column in the Examples table
+default_query_timeout = int(os.getenv("SQL_QUERY_TIMEOUT", "1800"))
+
+def query_timeout(params):
+    timeout = params.get("timeout", "").strip()
+    return int(timeout) if timeout else default_query_timeout
+
+def contains_failure(result):
+    return "Test_Sql_Status" in result.columns and result["Test_Sql_Status"].astype(str).str.contains("FAIL").any()
+
+# With SQL_PREFETCH set, the queries of all Examples rows of an outline are submitted when its first row
+# reaches the When step and run concurrently over pooled sessions. Under xdist the outline is only
+# prefetched with --dist loadfile, loadscope or loadgroup, otherwise each row runs its own query
+prefetch_enabled = os.getenv("SQL_PREFETCH", "").lower() in ("1", "true", "yes")
+prefetcher = None
+
+# With SQL_BATCH set, SQL_BATCH_SIZE rows of an outline are sent to the database in one request
+# (SQL_BATCH_MODE multistatement or union) and the results are handed back to each row's scenario
+batch_enabled = os.getenv("SQL_BATCH", "").lower() in ("1", "true", "yes")
+batcher = None
+
+def render_sql(sql_query, params):
+    assert sql_query in sql_registry, f"FileNotFound The File Specified {sql_query} does not exist under {sql_registry.search_path}"
+    return sql_registry.render(sql_query, params, os.getenv('DB_ENV'))
+
+def prepare_query(item):
+    params = helpers.get_example_params(item)
+    if 'sql_query' not in params:
+        return None
+    return render_sql(params['sql_query'], params), dict(timeout=query_timeout(params), max_rows=result_row_cap, stop_on=contains_failure, label=params['sql_query'])
+
+def record_query(request, sql_name, seconds, metrics):
+    import allure
+    # Recorded by the duration scheduler to order later runs longest-first
+    request.node.user_properties.append(("sql_query", sql_name))
+    if seconds is not None:
+        request.node.user_properties.append(("query_seconds", seconds))
+    if metrics is not None:
+        allure.attach(json.dumps(metrics, indent=4), name='Query Metrics', attachment_type=allure.attachment_type.JSON)
+
+def get_prefetcher(db_helper):
+    global prefetcher
+    if prefetcher is None:
+        prefetcher = query_engine.OutlinePrefetcher(query_engine.QueryEngine(db_helper), prepare_query)
+    return prefetcher
+
+def get_batcher(db_helper):
+    global batcher
+    if batcher is None:
+        batcher = query_engine.OutlineBatcher(db_helper, prepare_query, key_func=lambda item: helpers.get_example_params(item).get('tst_cd'))
+    return batcher
+
 @pytest.fixture
 def params(request):
-    return {key: str(value.replace(' %SEP% ',', ')) for key, value in (request.node.callspec.params['_pytest_bdd_example']).items()}
+    return helpers.get_example_params(request.node)
 
 @given(parsers.cfparse("Connect to the datasource"), target_fixture='conn')
-def establish_connection():
-    conn = dbHelper.connect()
+def establish_connection(db_helper):
+    conn = db_helper.connect()
     return conn
     
 # The Make as many  instances are there are data element names to check on the feature file 
 @given(parsers.cfparse("Data in the {data_entity} exists with the above Criteria"), target_fixture='conn')
-def establish_connection(DataElementToCheck):
-    table_name=DataElementToCheck
+def establish_connection(data_entity, db_helper):
+    table_name=data_entity
     database_name = os.environ.get("DB_ENV")
 
-    table = dbHelper.execute_query(f"SELECT CASE WHEN COUNT(*) > 0 THEN 'TRUE' ELSE 'FALSE' END AS TableExists FROM DBC.TablesV WHERE TableName = '{table_name}' AND DatabaseName like '{database_name}%';")
-    table_exists = 'FALSE' not in table.loc[0, "TableExists"]
+    # Looked up in the table list cached once per run for the environment instead of a DBC query per scenario
+    table_exists = table_catalog.get_table_catalog(db_helper, database_name).exists(table_name)
     
     assert table_exists, f"Table: {table_name} not found in ENV: {database_name}"
 
 @when(parsers.cfparse("The {sql_query} written to validate the above Criteria is executed"), target_fixture='result')
-def result(sql_query, params):
-    sql_file_path = helpers.find_file(sql_query, 'tests/package_example/step_defs/sql')
-
-    assert os.path.exists(sql_file_path), f"FileNotFound The File Specified at the path {sql_file_path} does not exist"
-    with open(os.path.abspath(sql_file_path)) as sql_file:
-        sql_query = sql_file.read()
-
-    sql_query = sql_query.replace("{$ENV}",f"{os.getenv('DB_ENV')}")
-    for key, value in params.items():     
-        sql_query = re.sub(fr'%{re.escape(key)}', value, sql_query, flags=re.IGNORECASE)
+def result(sql_query, params, request, db_helper):
+    import allure
+    sql_name = sql_query
+    if batch_enabled or prefetch_enabled:
+        # The rows ahead of this one are already in flight or fetched, only this row's result is waited for
+        outline_runner = get_batcher(db_helper) if batch_enabled else get_prefetcher(db_helper)
+        sql_query, result, metrics = outline_runner.get(request.node)
+        # A batched row is charged its share of the batch's time
+        seconds = metrics["phases"]["total"] / metrics.get("batch_rows", 1) if metrics is not None else None
+        record_query(request, sql_name, seconds, metrics)
+        allure.attach(sql_query, name='Executed SQL Query', attachment_type=allure.attachment_type.TEXT)
+        return result
 
-    result = dbHelper.execute_query(sql_query)
+    sql_query = render_sql(sql_query, params)
+    started = time.perf_counter()
+    result = db_helper.execute_query(sql_query, timeout=query_timeout(params), max_rows=result_row_cap, stop_on=contains_failure, label=sql_name)
+    seconds = time.perf_counter() - started
     allure.attach(sql_query, name='Executed SQL Query', attachment_type=allure.attachment_type.TEXT)
+    record_query(request, sql_name, seconds, db_helper.metrics.as_dict() if db_helper.metrics is not None else None)
 
     return result 
 
 @then(parsers.cfparse("The testname No rows are returned"))
-def assert_result(result, params):
+def assert_result(result, params, db_helper):
+    import pandas as pd
 
-    dbHelper.close_connection()
+    db_helper.close_connection()
+    result = query_engine.resolve(result)
     assert isinstance(result, pd.DataFrame), f"Failure in SQL execution in {params['tst_cd']} scenario"
 
     if not result.empty:
-        assert "FAIL" not in result.loc[0, "Test_Sql_Status"], f"Failure in {params['tst_cd']} scenario with SQL params: {params}"
+        assert not result["Test_Sql_Status"].astype(str).str.contains("FAIL").any(), f"Failure in {params['tst_cd']} scenario with SQL params: {params}"
     else:
         assert result.empty, f"Failure in {params['tst_cd']} scenario results dataframe not empty" 
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from src.utilities import column_profiler
+
+CSV = "code,amt,flag,txt,empty\n007,1,True,a,\n7,2.5,False,,\nabcde,,True,bb,\n7,3,False,c,\n"
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "extract.csv"
+    path.write_text(CSV)
+    return str(path)
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 10])
+def test_chunked_profile_equals_whole_file_profile(csv_file, chunksize):
+    whole = column_profiler.profile_csv(csv_file)
+    pd.testing.assert_frame_equal(column_profiler.profile_csv(csv_file, chunksize=chunksize), whole)
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10])
+def test_approximate_profile_matches_exact_counts_on_small_files(csv_file, chunksize):
+    whole = column_profiler.profile_csv(csv_file)
+    approximate = column_profiler.profile_csv(csv_file, chunksize=chunksize, approximate_distinct=True)
+    assert approximate["Distinct Count"].tolist() == whole["Distinct Count"].tolist()
+
+def test_text_codes_keep_their_leading_zeros(csv_file):
+    profile = column_profiler.profile_csv(csv_file, chunksize=1).set_index("Column")
+    assert profile.loc["code", "Distinct Count"] == 3
+    assert profile.loc["code", "Min Value (length)"] == 1
+    assert profile.loc["code", "Max Value (length)"] == 5
+    assert profile.loc["amt", "Null Count"] == 1
+    assert profile.loc["amt", "Max Value (length)"] == "Null"
+
+def test_profile_dataframe_reports_null_lengths_for_non_text_columns():
+    profile = column_profiler.profile_dataframe(pd.DataFrame({"a": [1, 2, 2], "b": ["x", None, "yyy"]})).set_index("Column")
+    assert profile.loc["a", "Distinct Count"] == 2
+    assert profile.loc["a", "Min Value (length)"] == "Null"
+    assert profile.loc["b", "Null Count"] == 1
+    assert (profile.loc["b", "Min Value (length)"], profile.loc["b", "Max Value (length)"]) == (1, 3)
+
+def test_hyperloglog_estimate_is_close():
+    counter = column_profiler.HyperLogLog()
+    counter.add([str(value) for value in range(50_000)])
+    assert abs(counter.count() - 50_000) / 50_000 < 0.03
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+from src.utilities import helpers, row_diff
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+def test_identical_files_match(tmp_path):
+    source = write(tmp_path, "source.csv", "id,value\n1,a\n2,b\n")
+    diff = row_diff.diff_files(source, source)
+    assert diff.matches
+    assert diff.summary == {"source_rows": 2, "target_rows": 2, "missing": 0, "extra": 0, "matched": 2}
+
+@pytest.mark.parametrize("source_value, target_value", [("001", "1"), ("1.0", "1"), ("1e3", "1000")])
+def test_diff_files_compares_exact_text(tmp_path, source_value, target_value):
+    source = write(tmp_path, "source.csv", f"id,value\nA,{source_value}\n")
+    target = write(tmp_path, "target.csv", f"id,value\nA,{target_value}\n")
+    diff = row_diff.diff_files(source, target)
+    assert (diff.summary["missing"], diff.summary["extra"]) == (1, 1)
+
+def test_rows_are_compared_as_multisets(tmp_path):
+    source = write(tmp_path, "source.csv", "id,value\n1,a\n1,a\n2,b\n")
+    target = write(tmp_path, "target.csv", "id,value\n1,a\n2,b\n3,c\n")
+    diff = row_diff.diff_files(source, target)
+    assert (diff.summary["missing"], diff.summary["extra"]) == (1, 1)
+    assert diff.missing_rows.to_dict("records") == [{"id": "1", "value": "a"}]
+    assert diff.extra_rows.to_dict("records") == [{"id": "3", "value": "c"}]
+
+def test_diff_by_key_reports_changed_columns(tmp_path):
+    source = write(tmp_path, "source.csv", "id,name,amount\n1,a,10\n2,b,20\n3,c,30\n")
+    target = write(tmp_path, "target.csv", "id,name,amount\n1,a,10\n2,b,21\n4,d,40\n")
+    diff = row_diff.diff_files(source, target, key_columns=["id"], chunksize=2)
+    assert {key: diff.summary[key] for key in ("missing", "extra", "changed", "matched")} == {
+        "missing": 1, "extra": 1, "changed": 1, "matched": 1,
+    }
+    assert diff.mismatches.to_dict("records") == [
+        {"id": "2", "Column": "amount", "Source Value": "20", "Target Value": "21"}
+    ]
+
+def test_summary_only_skips_the_row_report(tmp_path):
+    source = write(tmp_path, "source.csv", "id\n1\n")
+    target = write(tmp_path, "target.csv", "id\n2\n")
+    diff = row_diff.diff_files(source, target, summary_only=True)
+    assert not diff.matches
+    assert diff.missing_rows is None
+
+def test_compare_dataframes_matches_numbers_by_value(tmp_path):
+    source = write(tmp_path, "source.csv", "id,value\n1,1\n2,2\n")
+    target = write(tmp_path, "target.csv", "id,value\n1.0,1.0\n3,2\n")
+    assert helpers.compare_dataframes(source, target).tolist() == [True, False]
+
+def test_hash_rows_keeps_large_integers_exact():
+    source = pd.DataFrame({"id": [12345678901234567]})
+    target = pd.DataFrame({"id": [12345678901234568]})
+    assert row_diff.hash_rows(source)[0] != row_diff.hash_rows(target)[0]
+
+def test_hash_rows_matches_ints_and_floats_of_the_same_value():
+    assert row_diff.hash_rows(pd.DataFrame({"a": [1, 2]})).tolist() == row_diff.hash_rows(pd.DataFrame({"a": [1.0, 2.0]})).tolist()
@@ -0,0 +1,43 @@
+import pytest
+from src.utilities import shard_runner
+
+NODEIDS = [f"test_example.py::test_outline[row-{position:02d}]" for position in range(10)]
+
+def shards(assignment, count):
+    return [sorted(nodeid for nodeid, shard in assignment.items() if shard == index) for index in range(count)]
+
+@pytest.mark.parametrize("count", [1, 3, 4, 10, 12])
+def test_every_scenario_runs_on_exactly_one_shard(count):
+    assignment = shard_runner.assign_shards(NODEIDS, count)
+    assert sorted(assignment) == sorted(NODEIDS)
+    assert all(0 <= shard < count for shard in assignment.values())
+
+def test_split_by_count_is_contiguous_and_balanced():
+    assert shards(shard_runner.assign_shards(NODEIDS, 3), 3) == [NODEIDS[0:4], NODEIDS[4:7], NODEIDS[7:10]]
+
+def test_split_does_not_depend_on_collection_order():
+    durations = {nodeid: float(position) for position, nodeid in enumerate(NODEIDS)}
+    for by_duration in (None, durations):
+        assert shard_runner.assign_shards(NODEIDS, 3, by_duration) == shard_runner.assign_shards(NODEIDS[::-1], 3, by_duration)
+
+def test_split_by_duration_balances_the_load():
+    durations = {NODEIDS[0]: 10.0, NODEIDS[1]: 6.0, NODEIDS[2]: 4.0, NODEIDS[3]: 3.0, NODEIDS[4]: 3.0}
+    assignment = shard_runner.assign_shards(NODEIDS[:5], 2, durations)
+    loads = [sum(durations[nodeid] for nodeid in shard) for shard in shards(assignment, 2)]
+    assert sorted(loads) == [13.0, 13.0]
+
+@pytest.mark.parametrize("value, expected", [("1/1", (1, 1)), ("2/4", (2, 4))])
+def test_parse_shard(value, expected):
+    assert shard_runner.parse_shard(value) == expected
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "1/0", "2", "a/b"])
+def test_parse_shard_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        shard_runner.parse_shard(value)
+
+def test_check_manifests_reports_missing_and_inconsistent_shards():
+    manifest = lambda shard, fingerprint="f": {"shard": shard, "shards": 3, "fingerprint": fingerprint}
+    assert shard_runner.check_manifests([manifest(1), manifest(2), manifest(3)]) == []
+    assert shard_runner.check_manifests([manifest(1), manifest(3)]) == ["Expected shards [1, 2, 3], merged [1, 3]"]
+    assert len(shard_runner.check_manifests([manifest(1), manifest(2, "g"), manifest(3)])) == 1
+    assert shard_runner.check_manifests([]) == ["No shard manifests found, the inputs were not run with --shard"]
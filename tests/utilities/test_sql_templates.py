@@ -0,0 +1,38 @@
+import pytest
+from src.utilities import sql_templates
+
+def template(text):
+    return sql_templates.SqlTemplate("test.sql", "test.sql", text)
+
+def test_render_substitutes_examples_columns_and_env():
+    sql = template("SELECT * FROM {$ENV}.Accounts WHERE Acct_Id = %acct_id AND Cd = '%TST_CD';")
+    assert sql.render({"acct_id": "42", "tst_cd": "A1"}, "DEV") == "SELECT * FROM DEV.Accounts WHERE Acct_Id = 42 AND Cd = 'A1';"
+
+def test_placeholder_takes_the_longest_matching_column_and_keeps_trailing_text():
+    sql = template("SELECT %tst_cd_x, %tst_cdSUFFIX")
+    assert sql.render({"tst_cd": "A", "tst_cd_x": "B"}, "DEV") == "SELECT B, ASUFFIX"
+
+def test_unmatched_placeholder_is_kept_and_reported():
+    sql = template("SELECT * FROM T WHERE a = %missing")
+    assert sql.render({}, "DEV") == "SELECT * FROM T WHERE a = %missing"
+    assert sql.unresolved_placeholders([]) == ["%missing"]
+
+@pytest.mark.parametrize("text", [
+    "SELECT * FROM T WHERE Name LIKE '%ABC%'",
+    "SELECT * FROM T WHERE Name = 'it''s %ABC'",
+    "SELECT * FROM T -- don't use %ABC here",
+    "SELECT * FROM T /* %ABC */",
+])
+def test_percent_in_literals_and_comments_is_not_reported(text):
+    sql = template(text)
+    assert sql.unresolved_placeholders(["tst_cd"]) == []
+    assert sql.render({"tst_cd": "A"}, "DEV") == text
+
+def test_registry_renders_and_validates(tmp_path):
+    (tmp_path / "check.sql").write_text("SELECT %value FROM {$ENV}.T WHERE Cd LIKE 'X%'")
+    registry = sql_templates.SqlTemplateRegistry(str(tmp_path))
+    assert "check.sql" in registry
+    assert registry.render("check.sql", {"value": "1"}, "DEV") == "SELECT 1 FROM DEV.T WHERE Cd LIKE 'X%'"
+    assert registry.validate("check.sql", {"value": "1"}) == []
+    assert registry.validate("check.sql", {}) == ["check.sql has placeholders with no Examples column: %value"]
+    assert registry.validate("absent.sql", {}) == [f"SQL file absent.sql not found under {tmp_path}"]